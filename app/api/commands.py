@@ -1,8 +1,11 @@
 import uuid
-from fastapi import APIRouter, Depends, HTTPException
-from psycopg import Connection
+from typing import AsyncIterator, Union
 
-from app.core.event_store import EventStore
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from app.config.settings import APPEND_BATCH_WINDOW_MS
+from app.core.append_batcher import AppendBatcher
+from app.core.async_event_store import AsyncEventStore
 from app.schemas.commands import (
     CreateThreadRequest,
     CreateThreadResponse,
@@ -11,64 +14,107 @@ from app.schemas.commands import (
     ForkThreadRequest,
     ForkThreadResponse,
 )
-from app.db.fastapi import get_db
+from app.db.fastapi import async_pool
 
 
 router = APIRouter(prefix="/commands", tags=["commands"])
 
+# Started and stopped by the API lifespan (app/api/main.py)
+append_batcher = AppendBatcher(async_pool) if APPEND_BATCH_WINDOW_MS > 0 else None
+
+Appender = Union[AsyncEventStore, AppendBatcher]
+
+
+async def get_event_store() -> AsyncIterator[Appender]:
+    if append_batcher is not None:
+        yield append_batcher
+        return
+
+    async with async_pool.connection() as conn:
+        yield AsyncEventStore(conn)
+
 
-def get_event_store(conn: Connection = Depends(get_db)) -> EventStore:
-    return EventStore(conn)
+def _client_key(command: str, idempotency_key: str | None) -> str | None:
+    # Client keys share one unique index with the worker's reply:<id> keys,
+    # so they are namespaced, and scoped to the command they were sent to
+    if idempotency_key is None:
+        return None
+    return f"client:{command}:{idempotency_key}"
+
+
+def _check_replay(matches: bool):
+    # A replayed append must describe the same request as the first one
+    if not matches:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request",
+        )
 
 @router.post("/create-thread", response_model=CreateThreadResponse)
-def create_thread(
+async def create_thread(
     req: CreateThreadRequest,
-    store: EventStore = Depends(get_event_store),
+    store: Appender = Depends(get_event_store),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
 ):
     thread_id = req.thread_id or f"thread-{uuid.uuid4().hex[:8]}"
 
-    event = store.append_event(
+    # A thread can only be created once
+    event = await store.append_event(
         thread_id=thread_id,
         event_type="ThreadCreated",
         payload={"thread_id": thread_id},
+        expected_version=0,
+        idempotency_key=_client_key("create-thread", idempotency_key),
     )
 
+    # A replayed request may have generated a different thread id the first time
+    _check_replay(req.thread_id is None or event.thread_id == req.thread_id)
     return CreateThreadResponse(
-        thread_id=thread_id,
+        thread_id=event.thread_id,
         event_id=str(event.event_id),
+        event_number=event.event_number,
     )
 
 @router.post("/send-message", response_model=SendMessageResponse)
-def send_message(
+async def send_message(
     req: SendMessageRequest,
-    store: EventStore = Depends(get_event_store),
+    store: Appender = Depends(get_event_store),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
 ):
     if not req.content.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
 
-    event = store.append_event(
+    event = await store.append_event(
         thread_id=req.thread_id,
         event_type="UserMessageAdded",
         payload={
             "content": req.content,
             "role": "user",
         },
+        expected_version=req.expected_version,
+        idempotency_key=_client_key("send-message", idempotency_key),
+    )
+    _check_replay(
+        event.thread_id == req.thread_id
+        and event.payload["content"] == req.content
     )
 
     return SendMessageResponse(
-        thread_id=req.thread_id,
+        thread_id=event.thread_id,
         event_id=str(event.event_id),
+        event_number=event.event_number,
     )
 
 
 @router.post("/fork-thread", response_model=ForkThreadResponse)
-def fork_thread(
+async def fork_thread(
     req: ForkThreadRequest,
-    store: EventStore = Depends(get_event_store),
+    store: Appender = Depends(get_event_store),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
 ):
     new_thread_id = f"branch-{uuid.uuid4().hex[:8]}"
 
-    store.append_events(
+    events = await store.append_events(
         thread_id=new_thread_id,
         events=[
             (
@@ -83,6 +129,12 @@ def fork_thread(
                 },
             ),
         ],
+        expected_version=0,
+        idempotency_key=_client_key("fork-thread", idempotency_key),
+    )
+    _check_replay(
+        events[1].payload["parent_thread_id"] == req.source_thread_id
+        and events[1].payload["from_event_number"] == req.event_number
     )
 
-    return ForkThreadResponse(new_thread_id=new_thread_id)
+    return ForkThreadResponse(new_thread_id=events[0].thread_id)
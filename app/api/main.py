@@ -1,12 +1,57 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
 
-from app.api.commands import router as command_router
-from app.api.reads import router as read_router
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-app = FastAPI(title="RewindAI API")
+from app.api.commands import append_batcher, router as command_router
+from app.api.reads import reply_stream_hub, router as read_router
+from app.core.event_store import ConcurrencyError
+from app.core.metrics import register_lag_collector
+from app.db.fastapi import async_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await async_pool.open()
+    if append_batcher is not None:
+        await append_batcher.start()
+    await reply_stream_hub.start()
+    try:
+        yield
+    finally:
+        await reply_stream_hub.stop()
+        if append_batcher is not None:
+            await append_batcher.stop()
+        await async_pool.close()
+
+
+app = FastAPI(title="RewindAI API", lifespan=lifespan)
 
 # Command APIs (write side)
 app.include_router(command_router)
 
 # Read APIs (projection-backed)
 app.include_router(read_router)
+
+register_lag_collector()
+
+
+# Plain def: FastAPI runs it in the threadpool, so the lag collector's
+# database query never blocks the event loop
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.exception_handler(ConcurrencyError)
+async def concurrency_error_handler(request: Request, exc: ConcurrencyError):
+    return JSONResponse(
+        status_code=409,
+        content={
+            "detail": str(exc),
+            "thread_id": exc.thread_id,
+            "expected_version": exc.expected_version,
+            "actual_version": exc.actual_version,
+        },
+    )
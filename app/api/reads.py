@@ -1,22 +1,26 @@
+import asyncio
+import json
+
 from fastapi import APIRouter, Depends, Query, HTTPException
-from psycopg import Connection
+from fastapi.responses import StreamingResponse
+from psycopg import AsyncConnection
 from psycopg.rows import dict_row
 
-from app.db.fastapi import get_db
-from app.core.event_store import EventStore
+from app.config.settings import SEARCH_TEXT_CONFIG, SSE_KEEPALIVE_INTERVAL
+from app.core.reply_stream import ReplyStreamHub
+from app.db.fastapi import get_async_db
 
 
 router = APIRouter(prefix="/threads", tags=["reads"])
 
-
-def get_event_store(db: Connection = Depends(get_db)) -> EventStore:
-    return EventStore(db)
+# Started and stopped by the API lifespan (app/api/main.py)
+reply_stream_hub = ReplyStreamHub()
 
 
 @router.get("")
-def list_threads(db: Connection = Depends(get_db)):
-    with db.cursor() as cur:
-        cur.execute(
+async def list_threads(db: AsyncConnection = Depends(get_async_db)):
+    async with db.cursor() as cur:
+        await cur.execute(
             """
             SELECT
                 thread_id,
@@ -27,122 +31,157 @@ def list_threads(db: Connection = Depends(get_db)):
             ORDER BY event_number DESC
             """
         )
-        return cur.fetchall()
+        return await cur.fetchall()
+
+
+@router.get("/search")
+async def search_messages(
+    q: str = Query(..., min_length=1),
+    thread_id: str | None = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncConnection = Depends(get_async_db),
+):
+    # Rank and page on the GIN-indexed documents first; snippets are only
+    # built for the rows on the page
+    matches = """
+        SELECT
+            s.thread_id,
+            s.event_number,
+            s.message_id,
+            s.role,
+            s.created_at,
+            ts_rank(s.document, query.q) AS rank,
+            query.q
+        FROM message_search s
+        CROSS JOIN (SELECT websearch_to_tsquery(%s::regconfig, %s) AS q) query
+    """
+    params = [SEARCH_TEXT_CONFIG, q]
+
+    # Scoped to a thread: its own messages and what it inherits from
+    # every ancestor up to the fork point
+    if thread_id:
+        matches += """
+        JOIN (
+            SELECT %s::text AS thread_id, NULL::bigint AS up_to
+            UNION ALL
+            SELECT ancestor_thread_id, up_to
+            FROM thread_lineage
+            WHERE thread_id = %s
+        ) l
+          ON l.thread_id = s.thread_id
+         AND (l.up_to IS NULL OR s.event_number <= l.up_to)
+        """
+        params += [thread_id, thread_id]
+
+    matches += """
+        WHERE s.document @@ query.q
+        ORDER BY rank DESC, s.created_at DESC
+        LIMIT %s OFFSET %s
+    """
+    params += [limit, offset]
+
+    query = f"""
+        SELECT
+            m.thread_id,
+            m.message_id,
+            m.role,
+            m.event_number,
+            m.created_at,
+            m.rank,
+            ts_headline(%s::regconfig, t.content, m.q) AS snippet
+        FROM ({matches}) m
+        JOIN thread_timeline t
+          ON t.thread_id = m.thread_id
+         AND t.event_number = m.event_number
+        ORDER BY m.rank DESC, m.created_at DESC
+    """
+
+    async with db.cursor(row_factory=dict_row) as cur:
+        await cur.execute(query, [SEARCH_TEXT_CONFIG] + params)
+        return await cur.fetchall()
 
 
 @router.get("/{thread_id}/messages")
-def get_messages(
+async def get_messages(
     thread_id: str,
     checkpoint_id: str | None = Query(None),
-    db: Connection = Depends(get_db),
-    store: EventStore = Depends(get_event_store), # Added EventStore dependency
+    db: AsyncConnection = Depends(get_async_db),
 ):
-    # Check if this is a forked thread
-    fork_event = next((e for e in store.load_thread_events(thread_id) if e.event_type == "ThreadForked"), None)
-
-    all_messages = []
-
-    if fork_event:
-        parent_thread_id = fork_event.payload["parent_thread_id"]
-        from_event_number = fork_event.payload["from_event_number"]
-
-        # Load parent thread's messages up to the fork point
-        with db.cursor(row_factory=dict_row) as cur:
-            cur.execute(
-                """
-                SELECT
-                    role,
-                    content,
-                    message_id,
-                    event_number,
-                    created_at
-                FROM thread_timeline
-                WHERE thread_id = %s
-                  AND event_number <= %s
-                ORDER BY event_number ASC
-                """,
-                (parent_thread_id, from_event_number),
-            )
-            all_messages.extend(cur.fetchall())
-        
-        # Now load messages for the current forked thread
-        with db.cursor(row_factory=dict_row) as cur:
-            if checkpoint_id:
-                sql = """
-                SELECT
-                    role,
-                    content,
-                    message_id,
-                    event_number,
-                    created_at
-                FROM thread_timeline
-                WHERE thread_id = %s
-                  AND (
-                      checkpoint_id IS NULL
-                      OR checkpoint_id <= %s
-                  )
-                ORDER BY event_number
-                """
-                params = (thread_id, checkpoint_id)
-            else:
-                sql = """
-                SELECT
-                    role,
-                    content,
-                    message_id,
-                    event_number,
-                    created_at
-                FROM thread_timeline
-                WHERE thread_id = %s
-                ORDER BY event_number
-                """
-                params = (thread_id,)
-            cur.execute(sql, params)
-            all_messages.extend(cur.fetchall())
-
-        # Sort combined messages by event_number
-        all_messages.sort(key=lambda msg: msg["event_number"])
-        return all_messages
-    else:
-        # Original logic for non-forked threads
-        with db.cursor(row_factory=dict_row) as cur:
-            if checkpoint_id:
-                sql = """
-                SELECT
-                    role,
-                    content,
-                    message_id,
-                    event_number,
-                    created_at
-                FROM thread_timeline
-                WHERE thread_id = %s
-                  AND (
-                      checkpoint_id IS NULL
-                      OR checkpoint_id <= %s
-                  )
-                ORDER BY event_number
-                """
-                params = (thread_id, checkpoint_id)
-            else:
-                sql = """
-                SELECT
-                    role,
-                    content,
-                    message_id,
-                    event_number,
-                    created_at
-                FROM thread_timeline
-                WHERE thread_id = %s
-                ORDER BY event_number
-                """
-                params = (thread_id,)
-            cur.execute(sql, params)
-            return cur.fetchall()
+    # The thread itself plus every ancestor from the lineage projection, each
+    # read as a range of its timeline up to the fork point, oldest first
+    query = """
+        SELECT
+            t.role,
+            t.content,
+            t.message_id,
+            t.event_number,
+            t.created_at
+        FROM (
+            SELECT %s::text AS thread_id, NULL::bigint AS up_to, 0 AS depth
+            UNION ALL
+            SELECT ancestor_thread_id, up_to, depth
+            FROM thread_lineage
+            WHERE thread_id = %s
+        ) l
+        JOIN thread_timeline t
+          ON t.thread_id = l.thread_id
+         AND (l.up_to IS NULL OR t.event_number <= l.up_to)
+    """
+    params = [thread_id, thread_id]
+
+    # The checkpoint filter applies to the thread's own messages only
+    if checkpoint_id:
+        query += """
+        WHERE l.depth > 0
+           OR t.checkpoint_id IS NULL
+           OR t.checkpoint_id <= %s
+        """
+        params.append(checkpoint_id)
+
+    query += " ORDER BY l.depth DESC, t.event_number ASC"
+
+    async with db.cursor(row_factory=dict_row) as cur:
+        await cur.execute(query, params)
+        return await cur.fetchall()
+
+@router.get("/{thread_id}/stream")
+async def stream_replies(thread_id: str):
+    """
+    Server-sent events relaying replies to this thread while they are
+    generated: `delta` events with the next piece of text, then one `done`
+    event per reply. The complete reply is stored as usual and shows up in
+    /messages once projected.
+    """
+
+    async def events():
+        # Fed by the process-wide listener; no database connection per client
+        async with reply_stream_hub.subscribe(thread_id) as queue:
+            yield ": listening\n\n"
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                # Fell too far behind; the client reconnects
+                if message is None:
+                    return
+                yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @router.get("/{thread_id}/branches")
-def list_branches(thread_id: str, db: Connection = Depends(get_db)):
-    with db.cursor(row_factory=dict_row) as cur:
-        cur.execute(
+async def list_branches(thread_id: str, db: AsyncConnection = Depends(get_async_db)):
+    async with db.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
             """
             SELECT
                 thread_id,
@@ -155,13 +194,13 @@ def list_branches(thread_id: str, db: Connection = Depends(get_db)):
             """,
             (thread_id,),
         )
-        return cur.fetchall()
+        return await cur.fetchall()
 
 
 @router.get("/{thread_id}/head")
-def get_thread_head(thread_id: str, db: Connection = Depends(get_db)):
-    with db.cursor() as cur:
-        cur.execute(
+async def get_thread_head(thread_id: str, db: AsyncConnection = Depends(get_async_db)):
+    async with db.cursor() as cur:
+        await cur.execute(
             """
             SELECT
                 thread_id,
@@ -173,7 +212,7 @@ def get_thread_head(thread_id: str, db: Connection = Depends(get_db)):
             """,
             (thread_id,),
         )
-        row = cur.fetchone()
+        row = await cur.fetchone()
 
         if not row:
             raise HTTPException(status_code=404, detail="Thread not found")
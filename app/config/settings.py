@@ -9,6 +9,8 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_SSLMODE = os.getenv("DB_SSLMODE", "disable")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "4"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
 
 POSTGRES_CONN_STRING = (
     f"postgresql://{DB_USER}:{DB_PASSWORD}@"
@@ -18,3 +20,65 @@ POSTGRES_CONN_STRING = (
 
 MODEL_NAME = "gemini-2.5-flash-lite"
 REQUEST_TIMEOUT = 30
+
+# Seconds a hole in events.global_position may stay open before the
+# tail reader assumes the inserting transaction rolled back
+TAIL_GAP_TIMEOUT = 5.0
+
+# Rows fetched per round trip by the streaming (server-side cursor) readers
+STREAM_FETCH_SIZE = 500
+
+# Seconds a subscriber waits for a notification before running a
+# catch-up poll anyway
+SUBSCRIBE_POLL_INTERVAL = 5.0
+
+# Payload string values longer than this are compressed into event_blobs
+# when an EventStore is given a PayloadCodec
+PAYLOAD_OFFLOAD_THRESHOLD = 2048
+
+# Command-side group commit: appends from concurrent requests arriving within
+# this many milliseconds share one transaction (0 disables the batcher)
+APPEND_BATCH_WINDOW_MS = int(os.getenv("APPEND_BATCH_WINDOW_MS", "0"))
+APPEND_BATCH_MAX_SIZE = int(os.getenv("APPEND_BATCH_MAX_SIZE", "64"))
+
+# Projection batch size bounds; the worker doubles the batch while it is
+# behind and shrinks it back once it has caught up
+PROJECTION_BATCH_MIN = 100
+PROJECTION_BATCH_MAX = 5000
+
+# Projection work is split by thread hash into this many shards, each with its
+# own offset; every projection worker process leases a fair share of them
+PROJECTION_SHARDS = int(os.getenv("PROJECTION_SHARDS", "1"))
+
+# Events per page when a projection rebuild bulk-loads history
+REBUILD_PAGE_SIZE = 10000
+
+# Ports the workers serve Prometheus metrics on (the API serves /metrics)
+PROJECTION_METRICS_PORT = int(os.getenv("PROJECTION_METRICS_PORT", "9101"))
+CONVERSATION_METRICS_PORT = int(os.getenv("CONVERSATION_METRICS_PORT", "9102"))
+
+# Postgres text search configuration used for message search
+SEARCH_TEXT_CONFIG = os.getenv("SEARCH_TEXT_CONFIG", "english")
+
+# A claimed reply job is invisible to other conversation workers for this
+# long, renewed after every reply of the job; a failed one is retried after
+# REPLY_RETRY_DELAY seconds
+REPLY_LEASE_SECONDS = 300
+REPLY_RETRY_DELAY = 30
+
+# Threads the conversation worker replies to in parallel (one LLM call each)
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+
+# Live reply streaming: token deltas are coalesced for this many seconds
+# and published with pg_notify on one channel shared by all threads. Each
+# NOTIFY payload (encoded JSON, envelope included) stays within
+# STREAM_MAX_PAYLOAD_BYTES, below PostgreSQL's 8000-byte limit
+LLM_STREAM_CHANNEL = "llm_stream"
+STREAM_FLUSH_INTERVAL = 0.1
+STREAM_MAX_PAYLOAD_BYTES = 7500
+
+# Seconds between SSE keep-alive comments on an idle stream
+SSE_KEEPALIVE_INTERVAL = 15.0
+
+# Messages buffered per SSE client; a client further behind is disconnected
+SSE_QUEUE_SIZE = 1000
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from psycopg.pq import TransactionStatus
+from psycopg_pool import AsyncConnectionPool
+
+from app.config.settings import APPEND_BATCH_MAX_SIZE, APPEND_BATCH_WINDOW_MS
+from app.core.async_event_store import AsyncEventStore
+from app.core.codecs import PayloadCodec
+from app.core.event_store import Event
+
+
+@dataclass
+class _PendingAppend:
+    kwargs: Dict[str, Any]
+    future: asyncio.Future
+
+
+class AppendBatcher:
+    """
+    Group commit for appends coming from concurrent requests.
+
+    Appends are queued and written by a single background task. It gathers
+    whatever arrives within `window_ms` of the first one (up to `max_size`)
+    and writes the group in one transaction, so the group costs one commit
+    instead of one per request. Each append runs in its own savepoint, so a
+    ConcurrencyError or any other failure only fails that caller.
+
+    Exposes the same append_event/append_events surface as AsyncEventStore.
+    """
+
+    def __init__(
+        self,
+        pool: AsyncConnectionPool,
+        *,
+        window_ms: int = APPEND_BATCH_WINDOW_MS,
+        max_size: int = APPEND_BATCH_MAX_SIZE,
+        codec: Optional[PayloadCodec] = None,
+    ):
+        self.pool = pool
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self.codec = codec
+        self._queue: asyncio.Queue[_PendingAppend] = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        while not self._queue.empty():
+            pending = self._queue.get_nowait()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError("Append batcher stopped"))
+
+    async def append_event(
+        self,
+        *,
+        thread_id: str,
+        event_type: str,
+        payload: Dict[str, Any],
+        expected_version: Optional[int] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> Event:
+        created = await self.append_events(
+            thread_id=thread_id,
+            events=[(event_type, payload)],
+            expected_version=expected_version,
+            idempotency_key=idempotency_key,
+        )
+        return created[0]
+
+    async def append_events(self, **kwargs: Any) -> List[Event]:
+        kwargs["events"] = list(kwargs["events"])
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_PendingAppend(kwargs=kwargs, future=future))
+        return await future
+
+    # --------------------------------------------------
+    # Background writer
+    # --------------------------------------------------
+    async def _next_batch(self) -> List[_PendingAppend]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.window
+
+        while len(batch) < self.max_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[_PendingAppend]) -> None:
+        # Results are only handed out once the group has committed; any
+        # failure of the group itself fails every caller
+        results = []
+        try:
+            async with self.pool.connection() as conn:
+                store = AsyncEventStore(conn, codec=self.codec)
+                async with conn.transaction():
+                    # Queue order is kept, so appends to one thread stay ordered
+                    for pending in batch:
+                        try:
+                            # Savepoint per append: its follow-up reads (a
+                            # replay lookup, the version on a conflict) can
+                            # fail too without aborting the group
+                            async with conn.transaction():
+                                events = await store.append_events(**pending.kwargs)
+                            results.append((pending, events, None))
+                        except Exception as e:
+                            results.append((pending, None, e))
+
+                    # COMMIT of an aborted transaction silently rolls back
+                    if conn.info.transaction_status == TransactionStatus.INERROR:
+                        raise RuntimeError("Append group transaction was aborted")
+        except Exception as e:
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+
+        for pending, events, error in results:
+            if pending.future.done():
+                continue
+            if error is not None:
+                pending.future.set_exception(error)
+            else:
+                pending.future.set_result(events)
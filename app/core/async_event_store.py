@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence
+from uuid import uuid4
+
+import psycopg
+from psycopg.rows import dict_row
+
+from app.config.settings import STREAM_FETCH_SIZE, TAIL_GAP_TIMEOUT
+from app.core.codecs import PayloadCodec
+from app.core.event_store import (
+    CURRENT_VERSION_SQL,
+    IDEMPOTENT_REPLAY_SQL,
+    INSERT_BLOBS_SQL,
+    LINEAGE_DEPTH_SQL,
+    LINEAGE_MAX_DEPTH,
+    TAIL_POSITIONS_SQL,
+    ConcurrencyError,
+    Event,
+    TailPage,
+    _append_query,
+    _blob_params,
+    _check_lineage_depth,
+    _created_events,
+    _is_idempotency_conflict,
+    _lineage_query,
+    _prepare_append,
+    _settled_position,
+    _tail_events_query,
+    _thread_events_query,
+)
+from app.core.events import event_row
+
+
+class AsyncEventStore:
+    """EventStore on a psycopg AsyncConnection, with the same SQL and semantics."""
+
+    def __init__(
+        self,
+        conn: psycopg.AsyncConnection,
+        codec: Optional[PayloadCodec] = None,
+    ):
+        self.conn = conn
+        self.codec = codec
+
+    async def current_version(self, thread_id: str) -> int:
+        async with self.conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(CURRENT_VERSION_SQL, (thread_id,))
+            row = await cur.fetchone()
+            return row["version"] if row else 0
+
+    async def append_event(
+        self,
+        *,
+        thread_id: str,
+        event_type: str,
+        payload: Dict[str, Any],
+        expected_version: Optional[int] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> Event:
+        created = await self.append_events(
+            thread_id=thread_id,
+            events=[(event_type, payload)],
+            expected_version=expected_version,
+            idempotency_key=idempotency_key,
+        )
+        return created[0]
+
+    async def append_events(
+        self,
+        *,
+        thread_id: str,
+        events: Iterable[tuple[str, Dict[str, Any]]],
+        expected_version: Optional[int] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> List[Event]:
+        events = list(events)
+        if not events:
+            return []
+
+        # A retry of a known key is answered without inserting: a failed
+        # insert would still use up global positions and leave a hole that
+        # holds back the tail readers. The unique index covers concurrent
+        # retries racing past this check.
+        if idempotency_key:
+            replayed = await self.load_idempotent_append(idempotency_key, len(events))
+            if replayed:
+                return replayed
+
+        prepared = _prepare_append(events, self.codec)
+        sql, params = _append_query(
+            thread_id, prepared.rows, expected_version, idempotency_key
+        )
+
+        conflict = None
+        try:
+            async with self.conn.pipeline():
+                async with self.conn.transaction():
+                    async with self.conn.cursor(row_factory=dict_row) as cur:
+                        if prepared.blobs:
+                            await cur.executemany(INSERT_BLOBS_SQL, _blob_params(prepared.blobs))
+                        await cur.execute(sql, params)
+                        rows = await cur.fetchall()
+        except psycopg.errors.UniqueViolation as e:
+            if not _is_idempotency_conflict(e):
+                raise
+            conflict, rows = e, []
+
+        if not rows:
+            if idempotency_key:
+                replayed = await self.load_idempotent_append(idempotency_key, len(events))
+                if replayed:
+                    return replayed
+            if conflict:
+                raise conflict
+            raise ConcurrencyError(
+                thread_id=thread_id,
+                expected_version=expected_version,
+                actual_version=await self.current_version(thread_id),
+            )
+
+        return _created_events(rows, prepared)
+
+    async def load_idempotent_append(self, idempotency_key: str, count: int) -> List[Event]:
+        async with self.conn.cursor(row_factory=event_row) as cur:
+            await cur.execute(IDEMPOTENT_REPLAY_SQL, (idempotency_key, count))
+            return await cur.fetchall()
+
+    async def load_thread_events(
+        self,
+        thread_id: str,
+        *,
+        event_types: Optional[Sequence[str]] = None,
+    ) -> List[Event]:
+        sql, params = _thread_events_query(thread_id, None, event_types)
+        async with self.conn.cursor(row_factory=event_row) as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+
+    async def load_events_up_to(
+        self,
+        *,
+        thread_id: str,
+        event_number: int,
+        event_types: Optional[Sequence[str]] = None,
+        after: int = 0,
+    ) -> List[Event]:
+        sql, params = _thread_events_query(thread_id, event_number, event_types, after)
+        async with self.conn.cursor(row_factory=event_row) as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+
+    async def iter_thread_events(
+        self,
+        thread_id: str,
+        *,
+        after: int = 0,
+        up_to: Optional[int] = None,
+        event_types: Optional[Sequence[str]] = None,
+        fetch_size: int = STREAM_FETCH_SIZE,
+    ) -> AsyncIterator[Event]:
+        sql, params = _thread_events_query(thread_id, up_to, event_types, after)
+        name = f"thread_events_{uuid4().hex}"
+
+        async with self.conn.cursor(name=name, row_factory=event_row) as cur:
+            cur.itersize = fetch_size
+            await cur.execute(sql, params)
+            async for event in cur:
+                yield event
+
+    async def load_lineage_events(
+        self,
+        thread_id: str,
+        up_to: Optional[int] = None,
+        *,
+        event_types: Optional[Sequence[str]] = None,
+    ) -> List[Event]:
+        await self._check_lineage(thread_id, up_to)
+        sql, params = _lineage_query(thread_id, up_to, event_types)
+        async with self.conn.cursor(row_factory=event_row) as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+
+    async def _check_lineage(self, thread_id: str, up_to: Optional[int]) -> None:
+        async with self.conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(LINEAGE_DEPTH_SQL, (thread_id, up_to, LINEAGE_MAX_DEPTH + 1))
+            _check_lineage_depth(thread_id, await cur.fetchone())
+
+    async def iter_lineage_events(
+        self,
+        thread_id: str,
+        up_to: Optional[int] = None,
+        *,
+        event_types: Optional[Sequence[str]] = None,
+        fetch_size: int = STREAM_FETCH_SIZE,
+    ) -> AsyncIterator[Event]:
+        await self._check_lineage(thread_id, up_to)
+        sql, params = _lineage_query(thread_id, up_to, event_types)
+        name = f"lineage_events_{uuid4().hex}"
+
+        async with self.conn.cursor(name=name, row_factory=event_row) as cur:
+            cur.itersize = fetch_size
+            await cur.execute(sql, params)
+            async for event in cur:
+                yield event
+
+    async def read_tail(
+        self,
+        after_position: int,
+        limit: int = 100,
+        gap_timeout: float = TAIL_GAP_TIMEOUT,
+        *,
+        shard: Optional[tuple[int, int]] = None,
+        event_types: Optional[Sequence[str]] = None,
+    ) -> TailPage:
+        async with self.conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(TAIL_POSITIONS_SQL, (gap_timeout, after_position, limit))
+            position = _settled_position(await cur.fetchall(), after_position)
+
+        if position == after_position:
+            return TailPage(events=[], position=after_position)
+
+        sql, params = _tail_events_query(after_position, position, shard, event_types)
+        async with self.conn.cursor(row_factory=event_row) as cur:
+            await cur.execute(sql, params)
+            return TailPage(events=await cur.fetchall(), position=position)
+
+    async def load_events_after(
+        self,
+        after_position: int = 0,
+        limit: int = 100,
+    ) -> List[Event]:
+        page = await self.read_tail(after_position, limit=limit)
+        return page.events
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import hashlib
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+from app.config.settings import PAYLOAD_OFFLOAD_THRESHOLD
+
+try:
+    import zstandard
+except ImportError:  # zlib is always available
+    zstandard = None
+
+# Marks a payload value that lives in event_blobs: {"$blob": "<sha256>"}
+BLOB_MARKER = "$blob"
+
+
+@dataclass(frozen=True)
+class Blob:
+    digest: str
+    codec: str
+    data: bytes
+
+
+def compress(text: str) -> tuple[str, bytes]:
+    raw = text.encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor().compress(raw)
+    return "zlib", zlib.compress(raw)
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed payloads")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == "zlib":
+        raw = zlib.decompress(data)
+    else:
+        raise ValueError(f"Unknown blob codec: {codec}")
+    return raw.decode("utf-8")
+
+
+class PayloadCodec:
+    """
+    Moves the largest string value of a payload into a compressed,
+    content-addressed blob once it exceeds `threshold` characters.
+
+    Identical values (e.g. the same reply in several branches) hash to the
+    same digest and therefore share one blob row.
+    """
+
+    def __init__(self, threshold: int = PAYLOAD_OFFLOAD_THRESHOLD):
+        self.threshold = threshold
+
+    def encode(self, payload: Dict[str, Any]) -> tuple[Dict[str, Any], Optional[Blob]]:
+        candidates = [
+            (len(value), key)
+            for key, value in payload.items()
+            if isinstance(value, str) and len(value) > self.threshold
+        ]
+        if not candidates:
+            return payload, None
+
+        _, key = max(candidates)
+        value = payload[key]
+        digest = hashlib.sha256(value.encode("utf-8")).hexdigest()
+        codec, data = compress(value)
+
+        stored = dict(payload)
+        stored[key] = {BLOB_MARKER: digest}
+        return stored, Blob(digest=digest, codec=codec, data=data)
+
+
+class BlobPayload(Mapping):
+    """
+    Read-only payload whose offloaded value is only decompressed the first
+    time it is accessed.
+    """
+
+    __slots__ = ("_stored", "_key", "_codec", "_data", "_value")
+
+    def __init__(self, stored: Dict[str, Any], codec: str, data: bytes):
+        self._stored = stored
+        self._key = next(
+            key for key, value in stored.items()
+            if isinstance(value, dict) and BLOB_MARKER in value
+        )
+        self._codec = codec
+        self._data = data
+        self._value = None
+
+    def __getitem__(self, key: str) -> Any:
+        if key != self._key:
+            return self._stored[key]
+        if self._value is None:
+            self._value = decompress(self._codec, bytes(self._data))
+        return self._value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._stored)
+
+    def __len__(self) -> int:
+        return len(self._stored)
+
+    def __repr__(self) -> str:
+        return f"BlobPayload({dict(self)!r})"
+
+
+def resolve_payload(
+    stored: Dict[str, Any],
+    codec: Optional[str],
+    data: Optional[bytes],
+) -> Mapping[str, Any]:
+    if codec is None:
+        return stored
+    return BlobPayload(stored, codec, data)
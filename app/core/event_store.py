@@ -1,192 +1,621 @@
 from __future__ import annotations
-from app.core.events import StoredEvent
+from app.core.events import Event, event_row
+from app.core.codecs import Blob, PayloadCodec
+from app.config.settings import (
+    STREAM_FETCH_SIZE,
+    SUBSCRIBE_POLL_INTERVAL,
+    TAIL_GAP_TIMEOUT,
+)
 
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
 from uuid import UUID
-from datetime import datetime
 import psycopg
 from psycopg.rows import dict_row
-from psycopg.types.json import Json
+from psycopg.types.json import Jsonb
 
 from uuid import uuid4
+import json
+
+# LISTEN/NOTIFY channel fed by the notify_event_appended trigger
+EVENTS_CHANNEL = "events"
+
+# Event rows joined with their offloaded blob (if any). The column order is
+# the positional order of Event.__init__ (see event_row); the payload is
+# fetched as text and only parsed when Event.payload is read.
+SELECT_EVENTS_SQL = """
+    SELECT
+        e.event_id,
+        e.event_type,
+        e.thread_id,
+        e.event_number,
+        e.payload::text,
+        e.created_at,
+        e.global_position,
+        b.codec,
+        b.data
+    FROM events e
+    LEFT JOIN event_blobs b ON b.digest = e.blob_digest
+"""
+
+INSERT_BLOBS_SQL = """
+    INSERT INTO event_blobs (digest, codec, data)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (digest) DO NOTHING
+"""
+
+CURRENT_VERSION_SQL = "SELECT version FROM streams WHERE thread_id = %s"
+
+IDEMPOTENCY_INDEX = "uniq_events_idempotency_key"
+
+# The append recorded under an idempotency key: the keyed (first) event and
+# the ones numbered right after it. Appends are contiguous, so LIMIT is the
+# size of the batch.
+IDEMPOTENT_REPLAY_SQL = SELECT_EVENTS_SQL + """
+    JOIN events k
+      ON k.idempotency_key = %s
+     AND e.thread_id = k.thread_id
+     AND e.event_number >= k.event_number
+    ORDER BY e.event_number ASC
+    LIMIT %s
+"""
+
+# Forks deeper than this are treated as corrupt (e.g. a cycle): reading
+# such a lineage raises LineageTooDeepError
+LINEAGE_MAX_DEPTH = 64
+
+# (thread_id, up_to, depth) for a thread and every ancestor it was forked
+# from; each ancestor is bounded by the fork point of the thread below it
+LINEAGE_CTE_SQL = """
+    WITH RECURSIVE lineage (thread_id, up_to, depth) AS (
+        SELECT %s::text, %s::bigint, 0
+        UNION ALL
+        SELECT
+            f.payload->>'parent_thread_id',
+            (f.payload->>'from_event_number')::bigint,
+            l.depth + 1
+        FROM lineage l
+        JOIN events f
+          ON f.thread_id = l.thread_id
+         AND f.event_type = 'ThreadForked'
+         AND (l.up_to IS NULL OR f.event_number <= l.up_to)
+        WHERE l.depth < %s
+    )
+"""
+
+# Run one level past LINEAGE_MAX_DEPTH: an ancestor there would be missing
+# from what the history query returns
+LINEAGE_DEPTH_SQL = LINEAGE_CTE_SQL + "SELECT MAX(depth) AS depth FROM lineage"
+
+# Index-only scan over (global_position) INCLUDE (created_at)
+TAIL_POSITIONS_SQL = """
+    SELECT
+        global_position,
+        created_at < clock_timestamp() - make_interval(secs => %s)
+            AS settled
+    FROM events
+    WHERE global_position > %s
+    ORDER BY global_position ASC
+    LIMIT %s
+"""
+
+TAIL_EVENTS_SQL = SELECT_EVENTS_SQL + """
+    WHERE e.global_position > %s
+      AND e.global_position <= %s
+"""
+
+# Stable thread -> shard mapping, so all of a thread's events land in one shard
+THREAD_SHARD_SQL = "(hashtext(e.thread_id) & 2147483647) %% %s"
 
 
 @dataclass(frozen=True)
-class Event:
-    event_id: UUID
-    event_type: str
-    thread_id: str
-    event_number: int
-    payload: Dict[str, Any]
-    created_at: datetime
-    parent_event_id: Optional[UUID] = None
+class TailPage:
+    events: List[Event]
+    # Cursor to persist: every position up to here is either in `events`
+    # or belongs to a transaction that will never commit.
+    position: int
 
-class EventStore:
-    def __init__(self, conn: psycopg.Connection):
-        self.conn = conn
 
-    def _next_event_number(self, thread_id: str, cur) -> int:
-        # Per-thread transactional lock
-        cur.execute(
-            "SELECT pg_advisory_xact_lock(hashtext(%s))",
-            (thread_id,),
+class ConcurrencyError(Exception):
+    """Raised when an append's expected_version does not match the thread."""
+
+    def __init__(self, *, thread_id: str, expected_version: int, actual_version: int):
+        super().__init__(
+            f"Thread {thread_id} is at version {actual_version}, "
+            f"expected {expected_version}"
         )
+        self.thread_id = thread_id
+        self.expected_version = expected_version
+        self.actual_version = actual_version
+
 
-        # Safe aggregate AFTER lock
-        cur.execute(
-            """
-            SELECT COALESCE(MAX(event_number), 0) + 1 AS next_event_number
-            FROM events
+class LineageTooDeepError(Exception):
+    """Raised when a thread's fork lineage goes past LINEAGE_MAX_DEPTH."""
+
+    def __init__(self, thread_id: str):
+        super().__init__(
+            f"Lineage of thread {thread_id} is over {LINEAGE_MAX_DEPTH} forks deep "
+            "(corrupt or cyclic fork chain)"
+        )
+        self.thread_id = thread_id
+
+
+# --------------------------------------------------
+# Helpers shared with AsyncEventStore
+# --------------------------------------------------
+@dataclass
+class _PreparedAppend:
+    rows: List[tuple[UUID, str, Dict[str, Any], Optional[str]]]
+    blobs: List[Blob]
+    # Original (un-offloaded) payloads, handed back on the returned events
+    payloads: Dict[UUID, Dict[str, Any]]
+
+
+def _prepare_append(
+    events: List[tuple[str, Dict[str, Any]]],
+    codec: Optional[PayloadCodec],
+) -> _PreparedAppend:
+    prepared = _PreparedAppend(rows=[], blobs=[], payloads={})
+    for event_type, payload in events:
+        event_id = uuid4()
+        prepared.payloads[event_id] = payload
+        stored, blob = codec.encode(payload) if codec else (payload, None)
+        if blob:
+            prepared.blobs.append(blob)
+        prepared.rows.append((event_id, event_type, stored, blob.digest if blob else None))
+    return prepared
+
+
+def _blob_params(blobs: List[Blob]) -> List[tuple[str, str, bytes]]:
+    return [(blob.digest, blob.codec, blob.data) for blob in blobs]
+
+
+def _append_query(
+    thread_id: str,
+    rows: List[tuple[UUID, str, Dict[str, Any], Optional[str]]],
+    expected_version: Optional[int],
+    idempotency_key: Optional[str] = None,
+) -> tuple[str, List[Any]]:
+    # The stream row is bumped by len(rows) and the new version is used to
+    # number the batch, all in one statement. The row lock taken by the CTE
+    # serializes appends to this thread only.
+    if expected_version is None:
+        stream_sql = """
+            INSERT INTO streams (thread_id, version)
+            VALUES (%s, %s)
+            ON CONFLICT (thread_id)
+            DO UPDATE SET version = streams.version + EXCLUDED.version
+            RETURNING version
+        """
+        stream_params: List[Any] = [thread_id, len(rows)]
+    elif expected_version == 0:
+        stream_sql = """
+            INSERT INTO streams (thread_id, version)
+            VALUES (%s, %s)
+            ON CONFLICT (thread_id) DO NOTHING
+            RETURNING version
+        """
+        stream_params = [thread_id, len(rows)]
+    else:
+        stream_sql = """
+            UPDATE streams
+            SET version = version + %s
             WHERE thread_id = %s
-            """,
-            (thread_id,),
+              AND version = %s
+            RETURNING version
+        """
+        stream_params = [len(rows), thread_id, expected_version]
+
+    values = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(rows))
+    params: List[Any] = [*stream_params, thread_id, len(rows)]
+    for ordinal, (event_id, event_type, payload, blob_digest) in enumerate(rows, start=1):
+        key = idempotency_key if ordinal == 1 else None
+        params.extend((ordinal, event_id, event_type, Jsonb(payload), blob_digest, key))
+
+    sql = f"""
+        WITH stream AS ({stream_sql})
+        INSERT INTO events (
+            event_id,
+            event_type,
+            thread_id,
+            event_number,
+            payload,
+            blob_digest,
+            idempotency_key
         )
+        SELECT
+            v.event_id,
+            v.event_type,
+            %s,
+            stream.version - %s + v.ordinal,
+            v.payload,
+            v.blob_digest,
+            v.idempotency_key
+        FROM (
+            VALUES {values}
+        ) AS v(ordinal, event_id, event_type, payload, blob_digest, idempotency_key)
+        CROSS JOIN stream
+        RETURNING event_id, event_type, thread_id, event_number, created_at, global_position
+    """
+    return sql, params
 
-        return cur.fetchone()["next_event_number"]
+
+def _created_events(rows: List[Dict[str, Any]], prepared: _PreparedAppend) -> List[Event]:
+    created = [
+        Event(
+            row["event_id"],
+            row["event_type"],
+            row["thread_id"],
+            row["event_number"],
+            prepared.payloads[row["event_id"]],
+            row["created_at"],
+            row["global_position"],
+        )
+        for row in rows
+    ]
+    created.sort(key=lambda e: e.event_number)
+    return created
+
+
+def _is_idempotency_conflict(exc: psycopg.errors.UniqueViolation) -> bool:
+    return exc.diag.constraint_name == IDEMPOTENCY_INDEX
+
+
+def _thread_events_query(
+    thread_id: str,
+    up_to: Optional[int],
+    event_types: Optional[Sequence[str]],
+    after: int = 0,
+) -> tuple[str, List[Any]]:
+    sql = SELECT_EVENTS_SQL + " WHERE e.thread_id = %s"
+    params: List[Any] = [thread_id]
+
+    if after:
+        sql += " AND e.event_number > %s"
+        params.append(after)
+
+    if up_to is not None:
+        sql += " AND e.event_number <= %s"
+        params.append(up_to)
+
+    if event_types is not None:
+        sql += " AND e.event_type = ANY(%s)"
+        params.append(list(event_types))
+
+    sql += " ORDER BY e.event_number ASC"
+    return sql, params
+
+
+def _check_lineage_depth(thread_id: str, row: Dict[str, Any]) -> None:
+    # Rather than silently dropping the oldest ancestors' history
+    if row["depth"] > LINEAGE_MAX_DEPTH:
+        raise LineageTooDeepError(thread_id)
+
+
+def _lineage_query(
+    thread_id: str,
+    up_to: Optional[int],
+    event_types: Optional[Sequence[str]],
+) -> tuple[str, List[Any]]:
+    sql = LINEAGE_CTE_SQL + SELECT_EVENTS_SQL + """
+        JOIN lineage l ON l.thread_id = e.thread_id
+        WHERE (l.up_to IS NULL OR e.event_number <= l.up_to)
+    """
+    params: List[Any] = [thread_id, up_to, LINEAGE_MAX_DEPTH]
+
+    if event_types is not None:
+        sql += " AND e.event_type = ANY(%s)"
+        params.append(list(event_types))
+
+    # Oldest ancestor first, then down the fork chain to the thread itself
+    sql += " ORDER BY l.depth DESC, e.event_number ASC"
+    return sql, params
 
 
+def _tail_events_query(
+    after_position: int,
+    position: int,
+    shard: Optional[tuple[int, int]],
+    event_types: Optional[Sequence[str]],
+) -> tuple[str, List[Any]]:
+    sql = TAIL_EVENTS_SQL
+    params: List[Any] = [after_position, position]
+
+    if event_types is not None:
+        sql += " AND e.event_type = ANY(%s)"
+        params.append(list(event_types))
+
+    if shard is not None:
+        index, count = shard
+        sql += f" AND {THREAD_SHARD_SQL} = %s"
+        params.extend([count, index])
+
+    sql += " ORDER BY e.global_position ASC"
+    return sql, params
+
+
+def _settled_position(rows: List[Dict[str, Any]], after_position: int) -> int:
+    # Walk the contiguous prefix; a hole only ends the page while it is fresh
+    position = after_position
+    for row in rows:
+        if row["global_position"] != position + 1 and not row["settled"]:
+            break
+        position = row["global_position"]
+    return position
+
+
+class EventStore:
+    def __init__(
+        self,
+        conn: psycopg.Connection,
+        codec: Optional[PayloadCodec] = None,
+    ):
+        self.conn = conn
+        # Only needed for writing; offloaded payloads are always readable
+        self.codec = codec
+
+    def current_version(self, thread_id: str) -> int:
+        with self.conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(CURRENT_VERSION_SQL, (thread_id,))
+            row = cur.fetchone()
+            return row["version"] if row else 0
+
     def append_event(
         self,
         *,
         thread_id: str,
         event_type: str,
         payload: Dict[str, Any],
+        expected_version: Optional[int] = None,
+        idempotency_key: Optional[str] = None,
     ) -> Event:
-        with self.conn.transaction():
-            with self.conn.cursor(row_factory=dict_row) as cur:
-                event_number = self._next_event_number(thread_id, cur)
-                event_id = uuid4()
-
-                cur.execute(
-                    """
-                    INSERT INTO events (
-                        event_id,
-                        event_type,
-                        thread_id,
-                        event_number,
-                        payload
-                    )
-                    VALUES (%s, %s, %s, %s, %s)
-                    RETURNING *
-                    """,
-                    (
-                        event_id,
-                        event_type,
-                        thread_id,
-                        event_number,
-                        Json(payload),
-                    ),
-                )
-
-                row = cur.fetchone()
-                return Event(**row)
+        return self.append_events(
+            thread_id=thread_id,
+            events=[(event_type, payload)],
+            expected_version=expected_version,
+            idempotency_key=idempotency_key,
+        )[0]
 
     def append_events(
         self,
         *,
         thread_id: str,
         events: Iterable[tuple[str, Dict[str, Any]]],
+        expected_version: Optional[int] = None,
+        idempotency_key: Optional[str] = None,
     ) -> List[Event]:
-        created: List[Event] = []
-
-        with self.conn.transaction():
-            with self.conn.cursor(row_factory=dict_row) as cur:
-                for event_type, payload in events:
-                    event_number = self._next_event_number(thread_id, cur)
-                    event_id = uuid4()
-
-                    cur.execute(
-                        """
-                        INSERT INTO events (
-                            event_id,
-                            event_type,
-                            thread_id,
-                            event_number,
-                            payload
-                        )
-                        VALUES (%s, %s, %s, %s, %s)
-                        RETURNING *
-                        """,
-                        (
-                            event_id,
-                            event_type,
-                            thread_id,
-                            event_number,
-                            Json(payload),
-                        ),
-                    )
-
-                    created.append(Event(**cur.fetchone()))
-
-        return created
-
-    def load_thread_events(self, thread_id: str) -> List[Event]:
-        with self.conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
-                """
-                SELECT *
-                FROM events
-                WHERE thread_id = %s
-                ORDER BY event_number ASC
-                """,
-                (thread_id,),
+        """
+        Append events to a thread with contiguous event numbers.
+
+        If `expected_version` is given the append only succeeds when the
+        thread is currently at that version (0 = thread must not exist yet);
+        otherwise ConcurrencyError is raised and nothing is written.
+
+        If `idempotency_key` was already used, nothing is written and the
+        events of the original append are returned instead.
+        """
+        events = list(events)
+        if not events:
+            return []
+
+        # A retry of a known key is answered without inserting: a failed
+        # insert would still use up global positions and leave a hole that
+        # holds back the tail readers. The unique index covers concurrent
+        # retries racing past this check.
+        if idempotency_key:
+            replayed = self.load_idempotent_append(idempotency_key, len(events))
+            if replayed:
+                return replayed
+
+        prepared = _prepare_append(events, self.codec)
+        sql, params = _append_query(
+            thread_id, prepared.rows, expected_version, idempotency_key
+        )
+
+        conflict = None
+        try:
+            with self.conn.pipeline():
+                with self.conn.transaction():
+                    with self.conn.cursor(row_factory=dict_row) as cur:
+                        if prepared.blobs:
+                            cur.executemany(INSERT_BLOBS_SQL, _blob_params(prepared.blobs))
+                        cur.execute(sql, params)
+                        rows = cur.fetchall()
+        except psycopg.errors.UniqueViolation as e:
+            if not _is_idempotency_conflict(e):
+                raise
+            conflict, rows = e, []
+
+        if not rows:
+            # A retry can also surface as a version conflict (e.g. re-creating
+            # the same thread), so check for an earlier append first
+            if idempotency_key:
+                replayed = self.load_idempotent_append(idempotency_key, len(events))
+                if replayed:
+                    return replayed
+            if conflict:
+                raise conflict
+            raise ConcurrencyError(
+                thread_id=thread_id,
+                expected_version=expected_version,
+                actual_version=self.current_version(thread_id),
             )
-            return [Event(**row) for row in cur.fetchall()]
+
+        return _created_events(rows, prepared)
+
+    def load_idempotent_append(self, idempotency_key: str, count: int) -> List[Event]:
+        with self.conn.cursor(row_factory=event_row) as cur:
+            cur.execute(IDEMPOTENT_REPLAY_SQL, (idempotency_key, count))
+            return cur.fetchall()
+
+    def load_thread_events(
+        self,
+        thread_id: str,
+        *,
+        event_types: Optional[Sequence[str]] = None,
+    ) -> List[Event]:
+        sql, params = _thread_events_query(thread_id, None, event_types)
+        with self.conn.cursor(row_factory=event_row) as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
 
     def load_events_up_to(
         self,
         *,
         thread_id: str,
         event_number: int,
+        event_types: Optional[Sequence[str]] = None,
+        after: int = 0,
     ) -> List[Event]:
+        sql, params = _thread_events_query(thread_id, event_number, event_types, after)
+        with self.conn.cursor(row_factory=event_row) as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    def iter_thread_events(
+        self,
+        thread_id: str,
+        *,
+        after: int = 0,
+        up_to: Optional[int] = None,
+        event_types: Optional[Sequence[str]] = None,
+        fetch_size: int = STREAM_FETCH_SIZE,
+    ) -> Iterator[Event]:
+        """
+        Stream a thread's events through a named server-side cursor, holding
+        at most `fetch_size` rows in memory at a time.
+
+        Server-side cursors live inside a transaction, so the connection must
+        not be in autocommit mode.
+        """
+        sql, params = _thread_events_query(thread_id, up_to, event_types, after)
+        name = f"thread_events_{uuid4().hex}"
+
+        with self.conn.cursor(name=name, row_factory=event_row) as cur:
+            cur.itersize = fetch_size
+            cur.execute(sql, params)
+            yield from cur
+
+    def load_lineage_events(
+        self,
+        thread_id: str,
+        up_to: Optional[int] = None,
+        *,
+        event_types: Optional[Sequence[str]] = None,
+    ) -> List[Event]:
+        """
+        Load the history a thread sees, following ThreadForked events through
+        every ancestor: the root's events up to the first fork point, then
+        each branch's events up to the next one, and finally the thread's own
+        events up to `up_to`. Two round trips regardless of fork depth: the
+        lineage depth check (LineageTooDeepError), then the events.
+        """
+        self._check_lineage(thread_id, up_to)
+        sql, params = _lineage_query(thread_id, up_to, event_types)
+        with self.conn.cursor(row_factory=event_row) as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    def _check_lineage(self, thread_id: str, up_to: Optional[int]) -> None:
         with self.conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
-                """
-                SELECT *
-                FROM events
-                WHERE thread_id = %s
-                  AND event_number <= %s
-                ORDER BY event_number ASC
-                """,
-                (thread_id, event_number),
-            )
-            return [Event(**row) for row in cur.fetchall()]
-        
-    def load_events_after(
+            cur.execute(LINEAGE_DEPTH_SQL, (thread_id, up_to, LINEAGE_MAX_DEPTH + 1))
+            _check_lineage_depth(thread_id, cur.fetchone())
+
+    def iter_lineage_events(
         self,
-        last_event_id: UUID | None,
+        thread_id: str,
+        up_to: Optional[int] = None,
+        *,
+        event_types: Optional[Sequence[str]] = None,
+        fetch_size: int = STREAM_FETCH_SIZE,
+    ) -> Iterator[Event]:
+        """
+        Stream what load_lineage_events returns through a named server-side
+        cursor, `fetch_size` rows at a time. Needs an open transaction, like
+        iter_thread_events.
+        """
+        self._check_lineage(thread_id, up_to)
+        sql, params = _lineage_query(thread_id, up_to, event_types)
+        name = f"lineage_events_{uuid4().hex}"
+
+        with self.conn.cursor(name=name, row_factory=event_row) as cur:
+            cur.itersize = fetch_size
+            cur.execute(sql, params)
+            yield from cur
+
+    def read_tail(
+        self,
+        after_position: int,
         limit: int = 100,
-    ) -> List[StoredEvent]:
+        gap_timeout: float = TAIL_GAP_TIMEOUT,
+        *,
+        shard: Optional[tuple[int, int]] = None,
+        event_types: Optional[Sequence[str]] = None,
+    ) -> TailPage:
         """
-        Load events strictly after the given event_id (by insertion order).
-        If last_event_id is None, load from the beginning.
+        Read events strictly after the given global position.
+
+        Positions are handed out at insert time, so a transaction that
+        commits late leaves a temporary hole in the sequence. The page is cut
+        at the first hole unless the event after it was inserted more than
+        `gap_timeout` seconds ago (created_at is the insert time, not the
+        transaction start), in which case the hole is treated as a
+        rolled-back insert and skipped. Appends commit right after they
+        insert, so a hole that old is not an append still in flight.
+
+        `shard=(index, count)` only returns events of threads in that shard.
+        The page still spans `limit` global positions, and `position` still
+        covers the positions of other shards, so a shard's cursor moves on
+        even when none of its threads were written to. `event_types` narrows
+        the returned events the same way.
         """
 
         with self.conn.cursor(row_factory=dict_row) as cur:
-            if last_event_id is None:
-                cur.execute(
-                    """
-                    SELECT *
-                    FROM events
-                    ORDER BY created_at ASC, event_id ASC
-                    LIMIT %s
-                    """,
-                    (limit,),
-                )
-            else:
-                cur.execute(
-                    """
-                    SELECT *
-                    FROM events
-                    WHERE (created_at, event_id) >
-                        (SELECT created_at, event_id FROM events WHERE event_id = %s)
-                    ORDER BY created_at ASC, event_id ASC
-                    LIMIT %s
-                    """,
-                    (last_event_id, limit),
-                )
-
-            rows = cur.fetchall()
-
-        return [StoredEvent(**row) for row in rows]
\ No newline at end of file
+            cur.execute(TAIL_POSITIONS_SQL, (gap_timeout, after_position, limit))
+            position = _settled_position(cur.fetchall(), after_position)
+
+        if position == after_position:
+            return TailPage(events=[], position=after_position)
+
+        sql, params = _tail_events_query(after_position, position, shard, event_types)
+        with self.conn.cursor(row_factory=event_row) as cur:
+            cur.execute(sql, params)
+            return TailPage(events=cur.fetchall(), position=position)
+
+    def load_events_after(
+        self,
+        after_position: int = 0,
+        limit: int = 100,
+    ) -> List[Event]:
+        """
+        Load events strictly after the given global position.
+        Position 0 loads from the beginning.
+        """
+        return self.read_tail(after_position, limit=limit).events
+
+    def subscribe(
+        self,
+        *,
+        poll_interval: float = SUBSCRIBE_POLL_INTERVAL,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield batches of append notifications as they are committed.
+
+        Each notification is a dict with thread_id, event_type, event_number
+        and global_position. An empty batch is yielded right after LISTEN and
+        whenever `poll_interval` seconds pass without a notification, so the
+        consumer can run a catch-up poll for anything missed while it was not
+        listening.
+
+        The connection must be in autocommit mode and dedicated to the
+        subscription.
+        """
+        self.conn.execute(f"LISTEN {EVENTS_CHANNEL}")
+        yield []
+
+        while True:
+            received = list(self.conn.notifies(timeout=poll_interval, stop_after=1))
+            if received:
+                # Drain whatever else already arrived so bursts wake us once
+                received.extend(self.conn.notifies(timeout=0))
+            yield [json.loads(notify.payload) for notify in received]
@@ -1,15 +1,80 @@
-from dataclasses import dataclass
-from uuid import UUID
+import json
 from datetime import datetime
-from typing import Any, Dict, Optional
-
-
-@dataclass(frozen=True)
-class StoredEvent:
-    event_number: int
-    event_id: UUID
-    event_type: str
-    payload: Dict[str, Any]
-    thread_id: str
-    parent_event_id: Optional[UUID] = None  # ✅ DEFAULT
-    created_at: datetime = None
+from typing import Any, Mapping, Optional, Sequence, Union
+from uuid import UUID
+
+from app.core.codecs import resolve_payload
+
+
+class Event:
+    """
+    A stored event.
+
+    Rows are built positionally by `event_row`, and the payload stays as the
+    raw JSON text until `.payload` is first read, so scans that only look at
+    `event_type` or `event_number` never parse JSON or touch blobs.
+    """
+
+    __slots__ = (
+        "event_id",
+        "event_type",
+        "thread_id",
+        "event_number",
+        "created_at",
+        "global_position",
+        "parent_event_id",
+        "_payload",
+        "_blob_codec",
+        "_blob_data",
+    )
+
+    def __init__(
+        self,
+        event_id: UUID,
+        event_type: str,
+        thread_id: str,
+        event_number: int,
+        payload: Union[str, Mapping[str, Any]],
+        created_at: datetime,
+        global_position: Optional[int] = None,
+        blob_codec: Optional[str] = None,
+        blob_data: Optional[bytes] = None,
+        parent_event_id: Optional[UUID] = None,
+    ):
+        self.event_id = event_id
+        self.event_type = event_type
+        self.thread_id = thread_id
+        self.event_number = event_number
+        self.created_at = created_at
+        self.global_position = global_position
+        self.parent_event_id = parent_event_id
+        self._payload = payload
+        self._blob_codec = blob_codec
+        self._blob_data = blob_data
+
+    @property
+    def payload(self) -> Mapping[str, Any]:
+        if isinstance(self._payload, str):
+            self._payload = resolve_payload(
+                json.loads(self._payload), self._blob_codec, self._blob_data
+            )
+            self._blob_data = None
+        return self._payload
+
+    def __repr__(self) -> str:
+        return (
+            f"Event(event_type={self.event_type!r}, thread_id={self.thread_id!r}, "
+            f"event_number={self.event_number!r}, event_id={self.event_id!r})"
+        )
+
+
+def event_row(cursor):
+    """
+    psycopg row factory for queries selecting the columns in
+    app.core.event_store.SELECT_EVENTS_SQL, in that order.
+    """
+
+    def make_event(values: Sequence[Any]) -> Event:
+        return Event(*values)
+
+    return make_event
@@ -1,19 +1,104 @@
-from langchain_core.messages import HumanMessage
+from typing import Callable, List, Optional
+
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from langgraph.checkpoint.postgres import PostgresSaver
+from app.config.settings import LLM_CONCURRENCY
 from app.graph.builder import build_graph
-from app.db.langgraph import langgraph_saver
+from app.db.langgraph import langgraph_pool, langgraph_saver
 
 
-def run_langgraph_from_events(
-    *,
-    events,
+class GraphRuntime:
+    """
+    Long-lived LangGraph state for a worker process: a pooled PostgresSaver
+    and one compiled graph, shared by every reply. Per reply this leaves
+    only the LLM call and the checkpoint write.
+    """
+
+    def __init__(self, max_connections: int = LLM_CONCURRENCY):
+        self.pool = langgraph_pool(max_connections)
+        self.saver = PostgresSaver(self.pool)
+        self.graph = build_graph(self.saver)
+
+    def open(self):
+        self.pool.open(wait=True)
+
+    def close(self):
+        self.pool.close()
+
+    def check(self):
+        # Replace idle connections that died (e.g. after a database restart)
+        self.pool.check()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _chunk_text(chunk: AIMessageChunk) -> str:
+    # Gemini may send content as a list of parts rather than a string
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(
+        part if isinstance(part, str) else part.get("text", "")
+        for part in chunk.content
+    )
+
+
+def _invoke(
+    graph,
+    messages,
     thread_id: str,
     resume_checkpoint_id: str | None,
+    on_token: Optional[Callable[[str], None]] = None,
 ):
-    """
-    Runs the existing LangGraph EXACTLY like repl does,
-    but headlessly from the worker.
-    """
+    config = {"configurable": {"thread_id": thread_id}}
+
+    if resume_checkpoint_id:
+        config["configurable"]["checkpoint_id"] = resume_checkpoint_id
+
+    if on_token is None:
+        result = graph.invoke(
+            {"messages": messages},
+            config=config
+        )
+    else:
+        # Same run, but the model's tokens are handed out as they arrive;
+        # the last "values" chunk is the final state, as invoke returns it
+        result = None
+        for mode, chunk in graph.stream(
+            {"messages": messages},
+            config=config,
+            stream_mode=["messages", "values"],
+        ):
+            if mode == "values":
+                result = chunk
+                continue
+
+            message, _metadata = chunk
+            if isinstance(message, AIMessageChunk):
+                text = _chunk_text(message)
+                if text:
+                    on_token(text)
 
+    # After the run, the result directly contains the final messages
+    last_ai_message = result["messages"][-1]
+
+    # The checkpoint the run just wrote is the thread's latest one. The run
+    # config may pin the checkpoint we resumed from, so it is not reused here.
+    state = graph.get_state({"configurable": {"thread_id": thread_id}})
+    checkpoint_id = state.config["configurable"]["checkpoint_id"]
+
+    return {
+        "ai_message_id": last_ai_message.id,
+        "content": last_ai_message.content,
+        "checkpoint_id": checkpoint_id,
+    }
+
+
+def history_messages(events) -> List[HumanMessage]:
     # Extract messages from prior events
     messages = []
     for event in events:
@@ -21,30 +106,46 @@ def run_langgraph_from_events(
             messages.append(
                 HumanMessage(content=event.payload["content"])
             )
+    return messages
 
-    with langgraph_saver() as saver:
-        graph = build_graph(saver)
 
-        config = {"configurable": {"thread_id": thread_id}}
+def run_langgraph_from_events(
+    *,
+    events,
+    thread_id: str,
+    resume_checkpoint_id: str | None,
+    runtime: GraphRuntime | None = None,
+    on_token: Optional[Callable[[str], None]] = None,
+):
+    """
+    Runs the existing LangGraph EXACTLY like repl does,
+    but headlessly from the worker.
 
-        if resume_checkpoint_id:
-            config["configurable"]["checkpoint_id"] = resume_checkpoint_id
+    Without a runtime, a saver and graph are set up for this call only.
+    With on_token, the reply's text is also passed to it chunk by chunk
+    while it is generated; the returned result is the same either way.
+    """
+    return run_langgraph(
+        messages=history_messages(events),
+        thread_id=thread_id,
+        resume_checkpoint_id=resume_checkpoint_id,
+        runtime=runtime,
+        on_token=on_token,
+    )
 
-        result = graph.invoke(
-            {"messages": messages},
-            config=config
-        )
 
-        # After invoke, the result directly contains the final messages
-        last_ai_message = result["messages"][-1]
-        
-        # We need to get the state *after* the invoke to reliably get the checkpoint_id
-        # from the state's config. The invoke result does not contain the config.
-        state = graph.get_state(config) 
-        checkpoint_id = state.config["configurable"]["checkpoint_id"]
-
-        return {
-            "ai_message_id": last_ai_message.id,
-            "content": last_ai_message.content,
-            "checkpoint_id": checkpoint_id,
-        }
+def run_langgraph(
+    *,
+    messages: List[HumanMessage],
+    thread_id: str,
+    resume_checkpoint_id: str | None,
+    runtime: GraphRuntime | None = None,
+    on_token: Optional[Callable[[str], None]] = None,
+):
+    """run_langgraph_from_events for history already read into messages."""
+    if runtime is not None:
+        return _invoke(runtime.graph, messages, thread_id, resume_checkpoint_id, on_token)
+
+    with langgraph_saver() as saver:
+        graph = build_graph(saver)
+        return _invoke(graph, messages, thread_id, resume_checkpoint_id, on_token)
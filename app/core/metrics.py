@@ -0,0 +1,155 @@
+from prometheus_client import REGISTRY, Counter, Histogram, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+
+from app.db.postgres import get_app_db
+
+# --------------------------------------------------
+# Projection side
+# --------------------------------------------------
+EVENTS_PROJECTED = Counter(
+    "rewind_events_projected_total",
+    "Events applied by a projection",
+    ["projection"],
+)
+
+# Handlers only buffer rows; the database work happens when the batch
+# is flushed, one executemany per statement
+WRITE_SECONDS = Histogram(
+    "rewind_projection_write_seconds",
+    "Time to write one batch's rows into a projection table",
+    ["projection", "table"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+
+BATCH_SECONDS = Histogram(
+    "rewind_projection_batch_seconds",
+    "Time to apply and commit one projection batch, including the flush",
+    ["projection"],
+)
+
+# --------------------------------------------------
+# Conversation side
+# --------------------------------------------------
+REPLIES = Counter(
+    "rewind_replies_total",
+    "Replies generated by the conversation worker",
+    ["outcome"],
+)
+
+LLM_SECONDS = Histogram(
+    "rewind_llm_call_seconds",
+    "Latency of one LLM call",
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60),
+)
+
+# Lag of every projection offset row behind the head of the event log. The
+# first unprojected event's age comes from the global_position index.
+PROJECTION_LAG_SQL = """
+    SELECT
+        o.projection_name,
+        head.position - o.last_position AS lag_events,
+        COALESCE(
+            EXTRACT(EPOCH FROM clock_timestamp() - next_event.created_at),
+            0
+        ) AS lag_seconds
+    FROM projection_offsets o
+    CROSS JOIN (
+        SELECT COALESCE(MAX(global_position), 0) AS position FROM events
+    ) head
+    LEFT JOIN LATERAL (
+        SELECT e.created_at
+        FROM events e
+        WHERE e.global_position > o.last_position
+        ORDER BY e.global_position
+        LIMIT 1
+    ) next_event ON TRUE
+"""
+
+
+class ProjectionLagCollector:
+    """Reads projection lag from the database on every scrape."""
+
+    def collect(self):
+        lag_events = GaugeMetricFamily(
+            "rewind_projection_lag_events",
+            "Events between a projection offset and the head of the log",
+            labels=["offset"],
+        )
+        lag_seconds = GaugeMetricFamily(
+            "rewind_projection_lag_seconds",
+            "Age of the oldest event a projection offset has not passed yet",
+            labels=["offset"],
+        )
+
+        try:
+            with get_app_db(autocommit=True) as conn:
+                for row in conn.execute(PROJECTION_LAG_SQL).fetchall():
+                    lag_events.add_metric([row["projection_name"]], row["lag_events"])
+                    lag_seconds.add_metric([row["projection_name"]], float(row["lag_seconds"]))
+        except Exception as e:
+            print(f"❌ Could not read projection lag: {e}")
+
+        yield lag_events
+        yield lag_seconds
+
+
+# Threads with unanswered messages, across every worker, and how long the
+# oldest of them has been waiting
+REPLY_BACKLOG_SQL = """
+    SELECT
+        count(*) AS threads,
+        COALESCE(
+            EXTRACT(EPOCH FROM clock_timestamp() - MIN(enqueued_at)),
+            0
+        ) AS oldest_seconds
+    FROM reply_queue
+"""
+
+
+class ReplyBacklogCollector:
+    """Reads the reply queue's backlog from the database on every scrape."""
+
+    def collect(self):
+        threads = GaugeMetricFamily(
+            "rewind_pending_replies",
+            "Threads waiting for a reply (rows in reply_queue)",
+        )
+        oldest_seconds = GaugeMetricFamily(
+            "rewind_pending_replies_oldest_seconds",
+            "How long the longest-waiting thread has been in reply_queue",
+        )
+
+        try:
+            with get_app_db(autocommit=True) as conn:
+                row = conn.execute(REPLY_BACKLOG_SQL).fetchone()
+                threads.add_metric([], row["threads"])
+                oldest_seconds.add_metric([], float(row["oldest_seconds"]))
+        except Exception as e:
+            print(f"❌ Could not read reply backlog: {e}")
+
+        yield threads
+        yield oldest_seconds
+
+
+_lag_collector = None
+_backlog_collector = None
+
+
+def register_lag_collector():
+    global _lag_collector
+    if _lag_collector is None:
+        _lag_collector = ProjectionLagCollector()
+        REGISTRY.register(_lag_collector)
+
+
+def register_backlog_collector():
+    global _backlog_collector
+    if _backlog_collector is None:
+        _backlog_collector = ReplyBacklogCollector()
+        REGISTRY.register(_backlog_collector)
+
+
+def serve_metrics(port: int):
+    """Expose this process's metrics over HTTP (used by the workers)."""
+    start_http_server(port)
+    print(f"Metrics served on :{port}/metrics")
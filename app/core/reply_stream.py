@@ -0,0 +1,178 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator, Dict, Optional, Set
+
+from psycopg import AsyncConnection, sql
+from psycopg_pool import ConnectionPool
+
+from app.config.settings import (
+    LLM_STREAM_CHANNEL,
+    POSTGRES_CONN_STRING,
+    SSE_QUEUE_SIZE,
+    STREAM_FLUSH_INTERVAL,
+    STREAM_MAX_PAYLOAD_BYTES,
+)
+
+
+def _encoded_len(text: str) -> int:
+    # Bytes the text takes inside a JSON string. json.dumps escapes non-ASCII
+    # text, e.g. 6 bytes per CJK character and 12 per emoji.
+    return len(json.dumps(text)) - 2
+
+
+class ReplyStream:
+    """
+    Publishes a reply's tokens while it is generated, as coalesced deltas on
+    the LLM_STREAM_CHANNEL NOTIFY channel (relayed by ReplyStreamHub to
+    GET /threads/{thread_id}/stream).
+
+    This is a side channel only: nothing is written to the event log, and
+    the final LLMResponseGenerated/CheckpointCreated events are unchanged.
+    Publishing is best effort and never fails the reply, but if any part
+    of the stream could not be published its "done" message says error.
+    """
+
+    def __init__(self, pool: ConnectionPool, thread_id: str, reply_to: str):
+        # The pool's connections are autocommit, so notifications go out
+        # immediately rather than at the end of the reply transaction
+        self.pool = pool
+        self.thread_id = thread_id
+        self.reply_to = reply_to
+        self.seq = 0
+        self.failed = False
+        self._buffer = ""
+        self._buffer_bytes = 0
+        self._last_flush = time.monotonic()
+
+    def push(self, text: str) -> None:
+        self._buffer += text
+        self._buffer_bytes += _encoded_len(text)
+        if (
+            self._buffer_bytes >= self._delta_room()
+            or time.monotonic() - self._last_flush >= STREAM_FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        buffer, size = self._buffer, self._buffer_bytes
+        self._buffer, self._buffer_bytes = "", 0
+        self._last_flush = time.monotonic()
+        if not buffer:
+            return
+
+        room = self._delta_room()
+        if room <= 0:
+            self.failed = True
+            return
+        if size <= room:
+            self._publish({"type": "delta", "delta": buffer})
+            return
+
+        # Split by encoded size, never inside a character
+        delta, delta_bytes = [], 0
+        for char in buffer:
+            char_bytes = _encoded_len(char)
+            if delta and delta_bytes + char_bytes > room:
+                self._publish({"type": "delta", "delta": "".join(delta)})
+                delta, delta_bytes = [], 0
+            delta.append(char)
+            delta_bytes += char_bytes
+        self._publish({"type": "delta", "delta": "".join(delta)})
+
+    def close(self, *, ai_message_id: Optional[str] = None, error: bool = False) -> None:
+        self.flush()
+        self._publish({
+            "type": "done",
+            "ai_message_id": ai_message_id,
+            "error": error or self.failed,
+        })
+
+    def _delta_room(self) -> int:
+        # Payload budget left for the delta text once the envelope is in,
+        # with some slack for the seq number growing
+        envelope = len(self._payload({"type": "delta", "delta": ""}))
+        return STREAM_MAX_PAYLOAD_BYTES - envelope - 16
+
+    def _payload(self, message: dict) -> str:
+        return json.dumps({
+            "thread_id": self.thread_id,
+            "reply_to": self.reply_to,
+            "seq": self.seq + 1,
+            **message,
+        })
+
+    def _publish(self, message: dict) -> None:
+        payload = self._payload(message)
+        self.seq += 1
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("SELECT pg_notify(%s, %s)", (LLM_STREAM_CHANNEL, payload))
+        except Exception as e:
+            self.failed = True
+            print(f"❌ Could not publish reply stream for thread {self.thread_id}: {e}")
+
+
+class ReplyStreamHub:
+    """
+    Fans reply stream messages out to SSE clients. One LISTEN connection per
+    API process, however many clients are connected; each client gets a
+    queue of the messages for the thread it follows.
+
+    A client that falls SSE_QUEUE_SIZE messages behind gets None and is
+    disconnected, rather than buffering without bound or skipping text.
+    """
+
+    def __init__(self):
+        self._queues: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    @asynccontextmanager
+    async def subscribe(self, thread_id: str) -> AsyncIterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+        self._queues.setdefault(thread_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self._queues.get(thread_id, set())
+            queues.discard(queue)
+            if not queues:
+                self._queues.pop(thread_id, None)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with await AsyncConnection.connect(
+                    POSTGRES_CONN_STRING, autocommit=True
+                ) as conn:
+                    await conn.execute(
+                        sql.SQL("LISTEN {}").format(sql.Identifier(LLM_STREAM_CHANNEL))
+                    )
+                    async for notify in conn.notifies():
+                        self._dispatch(json.loads(notify.payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Messages sent while reconnecting are lost; clients stay subscribed
+                print(f"❌ Reply stream listener failed: {e}")
+                await asyncio.sleep(1)
+
+    def _dispatch(self, message: dict) -> None:
+        for queue in list(self._queues.get(message["thread_id"], ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
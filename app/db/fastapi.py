@@ -1,13 +1,21 @@
-import psycopg
 from psycopg.rows import dict_row
-from app.config.settings import POSTGRES_CONN_STRING
+from psycopg_pool import AsyncConnectionPool
+from app.config.settings import (
+    DB_POOL_MAX_SIZE,
+    DB_POOL_MIN_SIZE,
+    POSTGRES_CONN_STRING,
+)
 
-def get_db():
-    conn = psycopg.connect(
-        POSTGRES_CONN_STRING,
-        row_factory=dict_row,
-    )
-    try:
+# Opened and closed by the API lifespan (app/api/main.py)
+async_pool = AsyncConnectionPool(
+    POSTGRES_CONN_STRING,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    kwargs={"row_factory": dict_row},
+    open=False,
+)
+
+async def get_async_db():
+    # Commits on success, rolls back on error, returns the connection to the pool
+    async with async_pool.connection() as conn:
         yield conn
-    finally:
-        conn.close()
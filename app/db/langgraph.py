@@ -1,8 +1,27 @@
 from contextlib import contextmanager
 from langgraph.checkpoint.postgres import PostgresSaver
+from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 from app.config.settings import POSTGRES_CONN_STRING
 
 @contextmanager
 def langgraph_saver():
     with PostgresSaver.from_conn_string(POSTGRES_CONN_STRING) as saver:
         yield saver
+
+
+def langgraph_pool(max_size: int) -> ConnectionPool:
+    # Same connection settings PostgresSaver.from_conn_string uses. Every
+    # checkout is health-checked, and broken connections are replaced.
+    return ConnectionPool(
+        POSTGRES_CONN_STRING,
+        min_size=1,
+        max_size=max_size,
+        kwargs={
+            "autocommit": True,
+            "prepare_threshold": 0,
+            "row_factory": dict_row,
+        },
+        check=ConnectionPool.check_connection,
+        open=False,
+    )
@@ -2,8 +2,9 @@ import psycopg
 from psycopg.rows import dict_row
 from app.config.settings import POSTGRES_CONN_STRING
 
-def get_app_db():
+def get_app_db(autocommit: bool = False):
     return psycopg.connect(
         POSTGRES_CONN_STRING,
-        row_factory=dict_row
+        row_factory=dict_row,
+        autocommit=autocommit,
     )
@@ -1,3 +1,4 @@
+from app.core.metrics import LLM_SECONDS
 from app.models.llm import get_llm
 from app.graph.state import State
 
@@ -5,5 +6,6 @@ llm = get_llm()
 
 def call_google_node(state: State):
     messages = state["messages"]
-    response = llm.invoke(messages)
+    with LLM_SECONDS.time():
+        response = llm.invoke(messages)
     return {"messages": messages + [response]}
@@ -1,144 +1,230 @@
-from psycopg import Connection
+from app.config.settings import SEARCH_TEXT_CONFIG
 from app.core.event_store import Event
+from app.projections.projector import ProjectionBatch
 
+INSERT_TIMELINE_SQL = """
+    INSERT INTO thread_timeline (
+        thread_id,
+        message_id,
+        role,
+        content,
+        event_number,
+        created_at,
+        checkpoint_id
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT DO NOTHING
+"""
 
-def handle_user_message_added(conn: Connection, event: Event):
+# Index of checkpoint_id in an INSERT_TIMELINE_SQL row
+TIMELINE_CHECKPOINT_COLUMN = 6
+
+UPDATE_TIMELINE_CHECKPOINT_SQL = """
+    UPDATE thread_timeline
+    SET checkpoint_id = %s
+    WHERE thread_id = %s AND message_id = %s
+"""
+
+INSERT_MESSAGE_CHECKPOINT_SQL = """
+    INSERT INTO message_checkpoints (
+        thread_id,
+        ai_message_id,
+        checkpoint_id
+    )
+    VALUES (%s, %s, %s)
+    ON CONFLICT DO NOTHING
+"""
+
+UPSERT_THREAD_HEAD_SQL = """
+    INSERT INTO thread_heads (
+        thread_id,
+        latest_checkpoint_id,
+        latest_ai_message_id,
+        event_number
+    )
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (thread_id)
+    DO UPDATE SET
+        latest_checkpoint_id = EXCLUDED.latest_checkpoint_id,
+        latest_ai_message_id = EXCLUDED.latest_ai_message_id,
+        event_number = EXCLUDED.event_number
+"""
+
+INSERT_BRANCH_SQL = """
+    INSERT INTO branches_projection (
+        thread_id,
+        parent_thread_id,
+        from_event_number,
+        created_at
+    )
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT DO NOTHING
+"""
+
+# The parent, plus the parent's own ancestors one level further away. Within
+# an executemany, earlier forks are already visible to later ones.
+INSERT_LINEAGE_SQL = """
+    INSERT INTO thread_lineage (
+        thread_id,
+        ancestor_thread_id,
+        up_to,
+        depth
+    )
+    SELECT %s, %s, %s, 1
+    UNION ALL
+    SELECT %s, ancestor_thread_id, up_to, depth + 1
+    FROM thread_lineage
+    WHERE thread_id = %s
+    ON CONFLICT DO NOTHING
+"""
+
+INSERT_SEARCH_DOCUMENT_SQL = """
+    INSERT INTO message_search (
+        thread_id,
+        event_number,
+        message_id,
+        role,
+        created_at,
+        document
+    )
+    VALUES (%s, %s, %s, %s, %s, to_tsvector(%s::regconfig, %s))
+    ON CONFLICT DO NOTHING
+"""
+
+
+def handle_user_message_added(batch: ProjectionBatch, event: Event):
+    payload = event.payload
+    message_id = payload.get("message_id", event.event_id.hex)
+
+    batch.add(
+        INSERT_TIMELINE_SQL,
+        (
+            event.thread_id,
+            message_id,
+            payload["role"],
+            payload["content"],
+            event.event_number,
+            event.created_at,
+            None,
+        ),
+        # The table's conflict target; message ids are not unique
+        key=(event.thread_id, event.event_number),
+        alias=(event.thread_id, message_id),
+    )
+
+
+def handle_llm_response_generated(batch: ProjectionBatch, event: Event):
+    payload = event.payload
+
+    batch.add(
+        INSERT_TIMELINE_SQL,
+        (
+            event.thread_id,
+            payload["ai_message_id"],
+            "assistant",
+            payload["content"],
+            event.event_number,
+            event.created_at,
+            None,
+        ),
+        key=(event.thread_id, event.event_number),
+        alias=(event.thread_id, payload["ai_message_id"]),
+    )
+
+
+def handle_timeline_checkpoint(batch: ProjectionBatch, event: Event):
     payload = event.payload
 
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO thread_timeline (
-                thread_id,
-                message_id,
-                role,
-                content,
-                event_number,
-                created_at
-            )
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT DO NOTHING
-            """,
-            (
-                event.thread_id,
-                payload.get("message_id", event.event_id.hex),
-                payload["role"],
-                payload["content"],
-                event.event_number,
-                event.created_at,
-            ),
-        )
-
-
-def handle_llm_response_generated(conn: Connection, event: Event):
+    # The response is usually in the same batch: fill the column in before
+    # the row is written instead of updating it afterwards
+    rows = batch.find(INSERT_TIMELINE_SQL, (event.thread_id, payload["ai_message_id"]))
+    if rows:
+        for row in rows:
+            row[TIMELINE_CHECKPOINT_COLUMN] = payload["checkpoint_id"]
+        return
+
+    batch.add(
+        UPDATE_TIMELINE_CHECKPOINT_SQL,
+        (
+            payload["checkpoint_id"],
+            event.thread_id,
+            payload["ai_message_id"],
+        ),
+    )
+
+
+def handle_checkpoint_created(batch: ProjectionBatch, event: Event):
     payload = event.payload
-    print(f"  -> Projecting LLMResponseGenerated for thread {event.thread_id}, event {event.event_id}")
-
-    with conn.cursor() as cur:
-        # Timeline
-        cur.execute(
-            """
-            INSERT INTO thread_timeline (
-                thread_id,
-                message_id,
-                role,
-                content,
-                event_number,
-                created_at
-            )
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT DO NOTHING
-            """,
-            (
-                event.thread_id,
-                payload["ai_message_id"],
-                "assistant",
-                payload["content"],
-                event.event_number,
-                event.created_at,
-            ),
-        )
-
-
-def handle_checkpoint_created(conn: Connection, event: Event):
+
+    # Message → checkpoint index
+    batch.add(
+        INSERT_MESSAGE_CHECKPOINT_SQL,
+        (
+            event.thread_id,
+            payload["ai_message_id"],
+            payload["checkpoint_id"],
+        ),
+    )
+
+    # Thread head: only the batch's last checkpoint per thread is written
+    batch.add(
+        UPSERT_THREAD_HEAD_SQL,
+        (
+            event.thread_id,
+            payload["checkpoint_id"],
+            payload["ai_message_id"],
+            event.event_number,
+        ),
+        key=event.thread_id,
+    )
+
+
+def handle_thread_forked(batch: ProjectionBatch, event: Event):
     payload = event.payload
 
-    with conn.cursor() as cur:
-        # Message → checkpoint index
-        cur.execute(
-            """
-            INSERT INTO message_checkpoints (
-                thread_id,
-                ai_message_id,
-                checkpoint_id
-            )
-            VALUES (%s, %s, %s)
-            ON CONFLICT DO NOTHING
-            """,
-            (
-                event.thread_id,
-                payload["ai_message_id"],
-                payload["checkpoint_id"],
-            ),
-        )
-
-        cur.execute(
-            """
-            UPDATE thread_timeline
-            SET checkpoint_id = %s
-            WHERE thread_id = %s AND message_id = %s
-            """,
-            (
-                payload["checkpoint_id"],
-                event.thread_id,
-                payload["ai_message_id"],
-            ),
-        )
-
-        # Thread head
-        cur.execute(
-            """
-            INSERT INTO thread_heads (
-                thread_id,
-                latest_checkpoint_id,
-                latest_ai_message_id,
-                event_number
-            )
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (thread_id)
-            DO UPDATE SET
-                latest_checkpoint_id = EXCLUDED.latest_checkpoint_id,
-                latest_ai_message_id = EXCLUDED.latest_ai_message_id,
-                event_number = EXCLUDED.event_number
-            """,
-            (
-                event.thread_id,
-                payload["checkpoint_id"],
-                payload["ai_message_id"],
-                event.event_number,
-            ),
-        )
-
-
-def handle_thread_forked(conn: Connection, event: Event):
+    batch.add(
+        INSERT_BRANCH_SQL,
+        (
+            event.thread_id,
+            payload["parent_thread_id"],
+            payload["from_event_number"],
+            event.created_at,
+        ),
+    )
+
+
+def handle_thread_lineage(batch: ProjectionBatch, event: Event):
     payload = event.payload
 
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO branches_projection (
-                thread_id,
-                parent_thread_id,
-                from_event_number,
-                created_at
-            )
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT DO NOTHING
-            """,
-            (
-                event.thread_id,
-                payload["parent_thread_id"],
-                payload["from_event_number"],
-                event.created_at,
-            ),
-        )
+    batch.add(
+        INSERT_LINEAGE_SQL,
+        (
+            event.thread_id,
+            payload["parent_thread_id"],
+            payload["from_event_number"],
+            event.thread_id,
+            payload["parent_thread_id"],
+        ),
+    )
+
+
+def handle_search_document(batch: ProjectionBatch, event: Event):
+    payload = event.payload
+
+    if event.event_type == "LLMResponseGenerated":
+        message_id, role = payload["ai_message_id"], "assistant"
+    else:
+        message_id, role = payload.get("message_id", event.event_id.hex), payload["role"]
+
+    batch.add(
+        INSERT_SEARCH_DOCUMENT_SQL,
+        (
+            event.thread_id,
+            event.event_number,
+            message_id,
+            role,
+            event.created_at,
+            SEARCH_TEXT_CONFIG,
+            payload["content"],
+        ),
+    )
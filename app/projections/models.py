@@ -32,8 +32,29 @@ CREATE TABLE IF NOT EXISTS thread_heads (
 PROJECTION_OFFSET_SQL = """
 CREATE TABLE IF NOT EXISTS projection_offsets (
     projection_name TEXT PRIMARY KEY,
-    last_event_id UUID NOT NULL
+    last_position BIGINT NOT NULL DEFAULT 0
 );
+
+-- Offsets used to be stored as the last projected event_id
+ALTER TABLE projection_offsets
+ADD COLUMN IF NOT EXISTS last_position BIGINT NOT NULL DEFAULT 0;
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM information_schema.columns
+        WHERE table_name = 'projection_offsets'
+          AND column_name = 'last_event_id'
+    ) THEN
+        UPDATE projection_offsets o
+        SET last_position = e.global_position
+        FROM events e
+        WHERE e.event_id = o.last_event_id;
+
+        ALTER TABLE projection_offsets DROP COLUMN last_event_id;
+    END IF;
+END $$;
 """
 
 BRANCHES_PROJECTION_SQL = """
@@ -44,3 +65,35 @@ CREATE TABLE IF NOT EXISTS branches_projection (
     created_at TIMESTAMPTZ NOT NULL
 );
 """
+
+# Every ancestor of a forked thread (depth 1 = parent) and the last of its
+# event_numbers the thread inherits. Rows reference the ancestors' timelines
+# rather than copying their messages.
+THREAD_LINEAGE_SQL = """
+CREATE TABLE IF NOT EXISTS thread_lineage (
+    thread_id TEXT NOT NULL,
+    ancestor_thread_id TEXT NOT NULL,
+    up_to BIGINT NOT NULL,
+    depth INT NOT NULL,
+
+    PRIMARY KEY (thread_id, depth)
+);
+"""
+
+# Search documents for timeline messages; content is read back from
+# thread_timeline by (thread_id, event_number)
+MESSAGE_SEARCH_SQL = """
+CREATE TABLE IF NOT EXISTS message_search (
+    thread_id TEXT NOT NULL,
+    event_number BIGINT NOT NULL,
+    message_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL,
+    document TSVECTOR NOT NULL,
+
+    PRIMARY KEY (thread_id, event_number)
+);
+
+CREATE INDEX IF NOT EXISTS idx_message_search_document
+ON message_search USING GIN (document);
+"""
@@ -1,28 +1,93 @@
+from typing import Any, Callable, Dict, Hashable, List, Mapping, Optional, Sequence
+
+import re
+
 from psycopg import Connection
 from app.core.event_store import Event
-from app.projections import handlers
+from app.core.metrics import WRITE_SECONDS
+
+# Metrics label for a buffered statement
+TABLE_RE = re.compile(r"(?:INSERT\s+INTO|UPDATE)\s+(\w+)", re.IGNORECASE)
+
+
+def _statement_table(statement: str) -> str:
+    match = TABLE_RE.search(statement)
+    return match.group(1) if match else "other"
+
+
+class ProjectionBatch:
+    """
+    Rows produced by the handlers for one batch of events, grouped per
+    statement and written with one executemany per statement on flush.
 
+    Rows added under the same key replace each other (last write wins), so
+    e.g. repeated upserts of one thread's head become a single write. Rows
+    can also be looked up by an alias that need not be unique.
+    Statements are flushed in the order they were first used.
+    """
 
-EVENT_HANDLER_MAP = {
-    "UserMessageAdded": handlers.handle_user_message_added,
-    "LLMResponseGenerated": handlers.handle_llm_response_generated,
-    "CheckpointCreated": handlers.handle_checkpoint_created,
-    "ThreadForked": handlers.handle_thread_forked,
-}
+    def __init__(self, name: str = ""):
+        self._rows: Dict[str, Dict[Hashable, List[Any]]] = {}
+        # Secondary keys: alias -> keys of the rows added under it
+        self._aliases: Dict[str, Dict[Hashable, List[Hashable]]] = {}
+        # Metrics label
+        self.name = name
+
+    def add(
+        self,
+        statement: str,
+        params: Sequence[Any],
+        key: Optional[Hashable] = None,
+        *,
+        alias: Optional[Hashable] = None,
+    ) -> List[Any]:
+        rows = self._rows.setdefault(statement, {})
+        row = list(params)
+        if key is None:
+            key = object()
+        if alias is not None and key not in rows:
+            self._aliases.setdefault(statement, {}).setdefault(alias, []).append(key)
+        rows[key] = row
+        return row
+
+    def find(self, statement: str, alias: Hashable) -> List[List[Any]]:
+        # Buffered rows added under `alias`; they can still be amended
+        # before they are written
+        rows = self._rows.get(statement, {})
+        return [rows[key] for key in self._aliases.get(statement, {}).get(alias, [])]
+
+    def flush(self, conn: Connection):
+        with conn.cursor() as cur:
+            for statement, rows in self._rows.items():
+                with WRITE_SECONDS.labels(self.name, _statement_table(statement)).time():
+                    cur.executemany(statement, list(rows.values()))
+        self._rows.clear()
+        self._aliases.clear()
+
+
+Handler = Callable[[ProjectionBatch, Event], None]
 
 
 class Projector:
-    def __init__(self, conn: Connection):
+    """
+    Applies events to the projection tables. The caller owns the
+    transaction, so a batch and its offset update commit together.
+    """
+
+    def __init__(self, conn: Connection, handlers: Mapping[str, Handler], name: str = ""):
         self.conn = conn
+        self.handlers = handlers
+        # Metrics label
+        self.name = name
 
     def project_event(self, event: Event):
-        handler = EVENT_HANDLER_MAP.get(event.event_type)
-        if not handler:
-            return  # silence is valid
-
-        handler(self.conn, event)
-        self.conn.commit()
+        self.project_events([event])
 
     def project_events(self, events: list[Event]):
+        batch = ProjectionBatch(self.name)
         for event in events:
-            self.project_event(event)
+            handler = self.handlers.get(event.event_type)
+            if handler:
+                handler(batch, event)
+            # no handler: silence is valid
+        batch.flush(self.conn)
@@ -0,0 +1,358 @@
+from typing import Any, List, Optional, Sequence
+
+from psycopg import Connection, sql
+
+from app.config.settings import PROJECTION_BATCH_MAX, REBUILD_PAGE_SIZE
+from app.core.event_store import Event, EventStore
+from app.db.postgres import get_app_db
+from app.projections.models import PROJECTION_OFFSET_SQL
+from app.projections.projector import Projector
+from app.projections.registry import PROJECTIONS, Projection
+from app.projections.worker import ProjectionWorker
+
+# One shadow schema per projection (suffixed with its name), so projections
+# can be rebuilt independently
+SHADOW_SCHEMA = "projections_shadow"
+
+# Unconstrained, unlogged landing tables for COPY. Payloads may be offloaded
+# to compressed blobs, so they are decoded in Python rather than in SQL.
+STAGING_SQL = """
+CREATE UNLOGGED TABLE staged_messages (
+    global_position BIGINT NOT NULL,
+    thread_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    event_number BIGINT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE UNLOGGED TABLE staged_checkpoints (
+    global_position BIGINT NOT NULL,
+    thread_id TEXT NOT NULL,
+    ai_message_id TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    event_number BIGINT NOT NULL
+);
+
+CREATE UNLOGGED TABLE staged_forks (
+    global_position BIGINT NOT NULL,
+    thread_id TEXT NOT NULL,
+    parent_thread_id TEXT NOT NULL,
+    from_event_number BIGINT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL
+);
+"""
+
+# Set-based equivalents of replaying each projection's handlers in order.
+# Projections without an entry are rebuilt by replaying their handlers.
+TIMELINE_LOAD_SQL = """
+-- The checkpoint handler's UPDATE runs per checkpoint, so the last one wins
+INSERT INTO thread_timeline (
+    thread_id,
+    message_id,
+    role,
+    content,
+    event_number,
+    created_at,
+    checkpoint_id
+)
+SELECT
+    m.thread_id,
+    m.message_id,
+    m.role,
+    m.content,
+    m.event_number,
+    m.created_at,
+    c.checkpoint_id::uuid
+FROM staged_messages m
+LEFT JOIN (
+    SELECT DISTINCT ON (thread_id, ai_message_id)
+        thread_id, ai_message_id, checkpoint_id
+    FROM staged_checkpoints
+    ORDER BY thread_id, ai_message_id, global_position DESC
+) c ON c.thread_id = m.thread_id AND c.ai_message_id = m.message_id
+ON CONFLICT DO NOTHING;
+"""
+
+CHECKPOINTS_LOAD_SQL = """
+-- ON CONFLICT DO NOTHING in the handler: the first checkpoint wins
+INSERT INTO message_checkpoints (thread_id, ai_message_id, checkpoint_id)
+SELECT DISTINCT ON (ai_message_id) thread_id, ai_message_id, checkpoint_id
+FROM staged_checkpoints
+ORDER BY ai_message_id, global_position ASC;
+
+INSERT INTO thread_heads (
+    thread_id,
+    latest_checkpoint_id,
+    latest_ai_message_id,
+    event_number
+)
+SELECT DISTINCT ON (thread_id)
+    thread_id, checkpoint_id, ai_message_id, event_number
+FROM staged_checkpoints
+ORDER BY thread_id, global_position DESC;
+"""
+
+BRANCHES_LOAD_SQL = """
+INSERT INTO branches_projection (
+    thread_id,
+    parent_thread_id,
+    from_event_number,
+    created_at
+)
+SELECT DISTINCT ON (thread_id)
+    thread_id, parent_thread_id, from_event_number, created_at
+FROM staged_forks
+ORDER BY thread_id, global_position ASC;
+"""
+
+BULK_LOAD_SQL = {
+    "timeline": TIMELINE_LOAD_SQL,
+    "checkpoints": CHECKPOINTS_LOAD_SQL,
+    "branches": BRANCHES_LOAD_SQL,
+}
+
+DROP_STAGING_SQL = "DROP TABLE staged_messages, staged_checkpoints, staged_forks"
+
+
+# --------------------------------------------------
+# Shadow schema
+# --------------------------------------------------
+def _shadow_schema(projection: Projection) -> str:
+    return f"{SHADOW_SCHEMA}_{projection.name}"
+
+
+def _create_shadow(conn: Connection, projection: Projection):
+    schema = sql.Identifier(_shadow_schema(projection))
+
+    with conn.transaction():
+        conn.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(schema))
+        conn.execute(sql.SQL("CREATE SCHEMA {}").format(schema))
+
+        # Unqualified table names (models, handlers) now resolve to the
+        # shadow copies; events and projection_offsets only exist in public.
+        conn.execute(sql.SQL("SET search_path TO {}, public").format(schema))
+
+        for ddl in projection.tables.values():
+            conn.execute(ddl)
+        if projection.name in BULK_LOAD_SQL:
+            conn.execute(STAGING_SQL)
+
+
+# --------------------------------------------------
+# Bulk load
+# --------------------------------------------------
+def _staged_rows(events: List[Event]) -> tuple[List[Any], List[Any], List[Any]]:
+    # Mirrors the field extraction in app.projections.handlers
+    messages, checkpoints, forks = [], [], []
+
+    for event in events:
+        if event.event_type == "UserMessageAdded":
+            payload = event.payload
+            messages.append((
+                event.global_position,
+                event.thread_id,
+                payload.get("message_id", event.event_id.hex),
+                payload["role"],
+                payload["content"],
+                event.event_number,
+                event.created_at,
+            ))
+        elif event.event_type == "LLMResponseGenerated":
+            payload = event.payload
+            messages.append((
+                event.global_position,
+                event.thread_id,
+                payload["ai_message_id"],
+                "assistant",
+                payload["content"],
+                event.event_number,
+                event.created_at,
+            ))
+        elif event.event_type == "CheckpointCreated":
+            payload = event.payload
+            checkpoints.append((
+                event.global_position,
+                event.thread_id,
+                payload["ai_message_id"],
+                payload["checkpoint_id"],
+                event.event_number,
+            ))
+        elif event.event_type == "ThreadForked":
+            payload = event.payload
+            forks.append((
+                event.global_position,
+                event.thread_id,
+                payload["parent_thread_id"],
+                payload["from_event_number"],
+                event.created_at,
+            ))
+
+    return messages, checkpoints, forks
+
+
+def _copy_rows(conn: Connection, table: str, columns: List[str], rows: List[Any]):
+    if not rows:
+        return
+
+    statement = sql.SQL("COPY {} ({}) FROM STDIN").format(
+        sql.Identifier(table),
+        sql.SQL(", ").join(map(sql.Identifier, columns)),
+    )
+    with conn.cursor() as cur:
+        with cur.copy(statement) as copy:
+            for row in rows:
+                copy.write_row(row)
+
+
+def _bulk_load(conn: Connection, store: EventStore, projection: Projection) -> int:
+    position = 0
+    if projection.name not in BULK_LOAD_SQL:
+        return position
+
+    while True:
+        page = store.read_tail(
+            position,
+            limit=REBUILD_PAGE_SIZE,
+            event_types=projection.event_types,
+        )
+        if page.position == position:
+            break
+
+        messages, checkpoints, forks = _staged_rows(page.events)
+        with conn.transaction():
+            _copy_rows(
+                conn,
+                "staged_messages",
+                ["global_position", "thread_id", "message_id", "role",
+                 "content", "event_number", "created_at"],
+                messages,
+            )
+            _copy_rows(
+                conn,
+                "staged_checkpoints",
+                ["global_position", "thread_id", "ai_message_id",
+                 "checkpoint_id", "event_number"],
+                checkpoints,
+            )
+            _copy_rows(
+                conn,
+                "staged_forks",
+                ["global_position", "thread_id", "parent_thread_id",
+                 "from_event_number", "created_at"],
+                forks,
+            )
+
+        position = page.position
+        print(f"{projection.name}: staged events up to position {position}")
+
+    with conn.transaction():
+        conn.execute(BULK_LOAD_SQL[projection.name])
+        conn.execute(DROP_STAGING_SQL)
+
+    return position
+
+
+# --------------------------------------------------
+# Catch-up and swap
+# --------------------------------------------------
+def _catch_up(conn: Connection, store: EventStore, projection: Projection, position: int) -> int:
+    projector = Projector(conn, projection.handlers, projection.name)
+
+    while True:
+        page = store.read_tail(
+            position,
+            limit=PROJECTION_BATCH_MAX,
+            event_types=projection.event_types,
+        )
+        if page.position == position:
+            return position
+
+        with conn.transaction():
+            projector.project_events(page.events)
+        position = page.position
+
+
+def _swap(conn: Connection, store: EventStore, position: int, worker: ProjectionWorker) -> int:
+    """
+    Swap the shadow tables in and point every offset of the projection at
+    the rebuilt position, in one transaction.
+
+    The table locks only order workers around the swap: a batch in flight
+    finishes first, and a new one waits. After the wait PostgreSQL resolves
+    the table names again, so that batch writes into the swapped-in tables.
+    It is discarded only because its compare-and-set offset update no longer
+    matches. The CAS in ProjectionWorker._update_offset is what keeps
+    the rebuild correct.
+    """
+
+    projection = worker.projection
+    schema = _shadow_schema(projection)
+    live = [sql.Identifier("public", table) for table in projection.tables]
+
+    with conn.transaction():
+        conn.execute(
+            sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE").format(sql.SQL(", ").join(live))
+        )
+
+        # Whatever was appended since the last catch-up pass
+        position = _catch_up(conn, store, projection, position)
+
+        for table in projection.tables:
+            conn.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier("public", table)))
+            conn.execute(
+                sql.SQL("ALTER TABLE {} SET SCHEMA public").format(
+                    sql.Identifier(schema, table)
+                )
+            )
+
+        conn.execute(
+            """
+            UPDATE projection_offsets
+            SET last_position = %s
+            WHERE projection_name = ANY(%s)
+               OR projection_name LIKE %s
+            """,
+            (
+                position,
+                [worker.projection_name, *worker.offset_names()],
+                f"{worker.projection_name}:%",
+            ),
+        )
+        with conn.cursor() as cur:
+            cur.executemany(
+                """
+                INSERT INTO projection_offsets (projection_name, last_position)
+                VALUES (%s, %s)
+                ON CONFLICT (projection_name) DO NOTHING
+                """,
+                [(name, position) for name in worker.offset_names()],
+            )
+
+        conn.execute(sql.SQL("DROP SCHEMA {} CASCADE").format(sql.Identifier(schema)))
+
+    return position
+
+
+def rebuild_projection(projection: Projection):
+    worker = ProjectionWorker(projection)
+
+    with get_app_db(autocommit=True) as conn:
+        conn.execute(PROJECTION_OFFSET_SQL)
+        store = EventStore(conn)
+
+        print(f"{projection.name}: building shadow tables in schema {_shadow_schema(projection)}...")
+        _create_shadow(conn, projection)
+
+        position = _bulk_load(conn, store, projection)
+        print(f"{projection.name}: bulk load done at position {position}, catching up...")
+
+        position = _catch_up(conn, store, projection, position)
+        position = _swap(conn, store, position, worker)
+        print(f"✅ {projection.name}: rebuilt and swapped in at position {position}")
+
+
+def rebuild_projections(names: Optional[Sequence[str]] = None):
+    for name in names or list(PROJECTIONS):
+        rebuild_projection(PROJECTIONS[name])
@@ -0,0 +1,102 @@
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional
+
+from app.projections import handlers
+from app.projections.models import (
+    BRANCHES_PROJECTION_SQL,
+    MESSAGE_CHECKPOINTS_SQL,
+    MESSAGE_SEARCH_SQL,
+    THREAD_HEADS_SQL,
+    THREAD_LINEAGE_SQL,
+    THREAD_TIMELINE_SQL,
+)
+from app.projections.projector import Handler
+
+# Offset of the single pipeline that used to project every table
+LEGACY_OFFSET = "main_projection"
+
+
+@dataclass(frozen=True)
+class Projection:
+    """
+    A named read model: the handler for each event type it subscribes to and
+    the tables it owns (name -> DDL). Each projection keeps its own offsets,
+    so it catches up and rebuilds independently of the others.
+
+    `legacy_offset` lets a projection split out of the old pipeline start
+    where that pipeline left off instead of replaying from the beginning.
+    Projections whose handlers read rows written for other threads set
+    `sharded=False`, so one worker applies every event in global order.
+    """
+
+    name: str
+    handlers: Mapping[str, Handler]
+    tables: Mapping[str, str]
+    legacy_offset: Optional[str] = None
+    sharded: bool = True
+
+    @property
+    def event_types(self) -> list[str]:
+        return list(self.handlers)
+
+
+PROJECTIONS: Dict[str, Projection] = {}
+
+
+def register(projection: Projection) -> Projection:
+    if projection.name in PROJECTIONS:
+        raise ValueError(f"Projection {projection.name} is already registered")
+    PROJECTIONS[projection.name] = projection
+    return projection
+
+
+register(Projection(
+    name="timeline",
+    handlers={
+        "UserMessageAdded": handlers.handle_user_message_added,
+        "LLMResponseGenerated": handlers.handle_llm_response_generated,
+        "CheckpointCreated": handlers.handle_timeline_checkpoint,
+    },
+    tables={"thread_timeline": THREAD_TIMELINE_SQL},
+    legacy_offset=LEGACY_OFFSET,
+))
+
+register(Projection(
+    name="checkpoints",
+    handlers={
+        "CheckpointCreated": handlers.handle_checkpoint_created,
+    },
+    tables={
+        "message_checkpoints": MESSAGE_CHECKPOINTS_SQL,
+        "thread_heads": THREAD_HEADS_SQL,
+    },
+    legacy_offset=LEGACY_OFFSET,
+))
+
+register(Projection(
+    name="branches",
+    handlers={
+        "ThreadForked": handlers.handle_thread_forked,
+    },
+    tables={"branches_projection": BRANCHES_PROJECTION_SQL},
+    legacy_offset=LEGACY_OFFSET,
+))
+
+# Reads the parent's lineage rows, which may belong to any shard
+register(Projection(
+    name="lineage",
+    handlers={
+        "ThreadForked": handlers.handle_thread_lineage,
+    },
+    tables={"thread_lineage": THREAD_LINEAGE_SQL},
+    sharded=False,
+))
+
+register(Projection(
+    name="search",
+    handlers={
+        "UserMessageAdded": handlers.handle_search_document,
+        "LLMResponseGenerated": handlers.handle_search_document,
+    },
+    tables={"message_search": MESSAGE_SEARCH_SQL},
+))
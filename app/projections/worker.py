@@ -1,21 +1,81 @@
+import sys
+import threading
 import time
-from psycopg import Connection
+from psycopg import Connection, Rollback
+from app.config.settings import (
+    PROJECTION_BATCH_MAX,
+    PROJECTION_BATCH_MIN,
+    PROJECTION_METRICS_PORT,
+    PROJECTION_SHARDS,
+)
+from app.core.metrics import (
+    BATCH_SECONDS,
+    EVENTS_PROJECTED,
+    register_lag_collector,
+    serve_metrics,
+)
 from app.db.postgres import get_app_db
 from app.core.event_store import EventStore
 from app.projections.projector import Projector
-from app.projections.models import (
-    PROJECTION_OFFSET_SQL,
-    THREAD_TIMELINE_SQL,
-    MESSAGE_CHECKPOINTS_SQL,
-    THREAD_HEADS_SQL,
-    BRANCHES_PROJECTION_SQL,
-)
+from app.projections.models import PROJECTION_OFFSET_SQL
+from app.projections.registry import PROJECTIONS, Projection
+
+# Shard leases are session-level advisory locks keyed (namespace, shard), so
+# they vanish with the worker's connection. The namespace comes from the
+# projection name, so every projection has its own set of shards. Key =
+# shard count is a shared "worker alive" lock used to count live workers.
+LOCK_NAMESPACE_SQL = "hashtext(%s) & 2147483647"
+
+JOIN_WORKERS_SQL = f"SELECT pg_advisory_lock_shared({LOCK_NAMESPACE_SQL}, %s)"
+
+LIVE_WORKERS_SQL = f"""
+SELECT count(*) AS workers
+FROM pg_locks
+WHERE locktype = 'advisory'
+  AND database = (SELECT oid FROM pg_database WHERE datname = current_database())
+  AND classid = ({LOCK_NAMESPACE_SQL})::oid
+  AND objid = %s::oid
+  AND objsubid = 2
+  AND granted
+"""
+
+CLAIM_SHARD_SQL = f"SELECT pg_try_advisory_lock({LOCK_NAMESPACE_SQL}, %s) AS claimed"
+
+RELEASE_SHARD_SQL = f"SELECT pg_advisory_unlock({LOCK_NAMESPACE_SQL}, %s)"
+
+# Offset rows nothing reads any more: a projection's rows for another shard
+# layout (or its unsharded row), once every row of the current layout exists.
+# Left behind they would report ever-growing lag.
+RETIRE_OFFSETS_SQL = """
+    DELETE FROM projection_offsets
+    WHERE (projection_name = %s OR starts_with(projection_name, %s))
+      AND NOT projection_name = ANY(%s)
+      AND (
+          SELECT count(*) FROM projection_offsets WHERE projection_name = ANY(%s)
+      ) = %s
+"""
+
+# Same for a legacy pipeline's row, once every projection seeded from it
+# has all of its own rows
+RETIRE_LEGACY_OFFSET_SQL = """
+    DELETE FROM projection_offsets
+    WHERE projection_name = %s
+      AND (
+          SELECT count(*) FROM projection_offsets WHERE projection_name = ANY(%s)
+      ) = %s
+"""
 
 
 class ProjectionWorker:
-    def __init__(self):
-        # Logical name for this projection pipeline
-        self.projection_name = "main_projection"
+    """Runs one registered projection: its shards, offsets and handlers."""
+
+    def __init__(self, projection: Projection, shard_count: int = PROJECTION_SHARDS):
+        self.projection = projection
+        self.projection_name = projection.name
+        self.shard_count = shard_count if projection.sharded else 1
+        # Shards currently leased by this worker
+        self.owned: set[int] = set()
+        self.batch_sizes: dict[int, int] = {}
 
     # --------------------------------------------------
     # Schema init
@@ -24,83 +84,208 @@ class ProjectionWorker:
     def _init_tables():
         with get_app_db() as conn:
             with conn.cursor() as cur:
-                cur.execute(THREAD_TIMELINE_SQL)
-                cur.execute(MESSAGE_CHECKPOINTS_SQL)
-                cur.execute(THREAD_HEADS_SQL)
                 cur.execute(PROJECTION_OFFSET_SQL)
-                cur.execute(BRANCHES_PROJECTION_SQL)
+                for projection in PROJECTIONS.values():
+                    for ddl in projection.tables.values():
+                        cur.execute(ddl)
             conn.commit()
 
     # --------------------------------------------------
-    # Offset handling (UUID-based)
+    # Shard leases
+    # --------------------------------------------------
+    def _shard_filter(self, shard: int) -> tuple[int, int] | None:
+        return None if self.shard_count == 1 else (shard, self.shard_count)
+
+    def _join(self, lease_conn: Connection):
+        lease_conn.execute(JOIN_WORKERS_SQL, (self.projection_name, self.shard_count))
+
+    def _rebalance(self, lease_conn: Connection):
+        """
+        Converge on ceil(shards / live workers) leases: hand back extras so a
+        newly started worker can pick them up, and claim free shards (e.g.
+        from a worker whose connection died) until the fair share is met.
+        """
+
+        row = lease_conn.execute(
+            LIVE_WORKERS_SQL, (self.projection_name, self.shard_count)
+        ).fetchone()
+        target = -(-self.shard_count // max(row["workers"], 1))
+
+        for shard in sorted(self.owned, reverse=True)[: max(len(self.owned) - target, 0)]:
+            lease_conn.execute(RELEASE_SHARD_SQL, (self.projection_name, shard))
+            self.owned.discard(shard)
+            print(f"{self.projection_name}: released shard {shard}")
+
+        for shard in range(self.shard_count):
+            if len(self.owned) >= target:
+                break
+            if shard in self.owned:
+                continue
+            row = lease_conn.execute(CLAIM_SHARD_SQL, (self.projection_name, shard)).fetchone()
+            if row["claimed"]:
+                self.owned.add(shard)
+                print(f"{self.projection_name}: claimed shard {shard}")
+
+    # --------------------------------------------------
+    # Offset handling (global position, one row per shard)
     # --------------------------------------------------
-    def _get_last_event_id(self, conn: Connection):
+    def _offset_name(self, shard: int) -> str:
+        if self.shard_count == 1:
+            return self.projection_name
+        return f"{self.projection_name}:{shard}/{self.shard_count}"
+
+    def offset_names(self) -> list[str]:
+        # The rows of the current shard layout
+        return [self._offset_name(shard) for shard in range(self.shard_count)]
+
+    def _retire_offsets(self, conn: Connection):
+        current = self.offset_names()
+        conn.execute(
+            RETIRE_OFFSETS_SQL,
+            (self.projection_name, f"{self.projection_name}:", current, current, len(current)),
+        )
+
+        legacy = self.projection.legacy_offset
+        if legacy:
+            heirs = [
+                name
+                for projection in PROJECTIONS.values()
+                if projection.legacy_offset == legacy
+                for name in ProjectionWorker(projection).offset_names()
+            ]
+            conn.execute(RETIRE_LEGACY_OFFSET_SQL, (legacy, heirs, len(heirs)))
+
+    def _get_last_position(self, conn: Connection, shard: int) -> int:
+        # A new shard offset (e.g. after PROJECTION_SHARDS changed) starts
+        # from the lowest of the projection's other shard offsets, so no
+        # thread's events are skipped; failing that from its unsharded
+        # offset, then from the legacy pipeline's
+        fallbacks = [self.projection_name]
+        if self.projection.legacy_offset:
+            fallbacks.append(self.projection.legacy_offset)
+
         with conn.cursor() as cur:
             cur.execute(
                 """
-                SELECT last_event_id
-                FROM projection_offsets
-                WHERE projection_name = %s
+                SELECT last_position
+                FROM (
+                    SELECT last_position, 0 AS priority
+                    FROM projection_offsets
+                    WHERE projection_name = %s
+                    UNION ALL
+                    SELECT MIN(last_position), 1
+                    FROM projection_offsets
+                    WHERE starts_with(projection_name, %s)
+                    HAVING count(*) > 0
+                    UNION ALL
+                    SELECT last_position, 1 + array_position(%s, projection_name)
+                    FROM projection_offsets
+                    WHERE projection_name = ANY(%s)
+                ) o
+                ORDER BY priority
+                LIMIT 1
                 """,
-                (self.projection_name,),
+                (self._offset_name(shard), f"{self.projection_name}:", fallbacks, fallbacks),
             )
             row = cur.fetchone()
-            return row["last_event_id"] if row else None
+            return row["last_position"] if row else 0
 
-    def _update_offset(self, conn: Connection, event_id):
+    def _update_offset(self, conn: Connection, shard: int, expected: int, position: int) -> bool:
+        # Compare-and-set: fails if another worker moved this shard meanwhile
         with conn.cursor() as cur:
             cur.execute(
                 """
-                INSERT INTO projection_offsets (projection_name, last_event_id)
+                INSERT INTO projection_offsets (projection_name, last_position)
                 VALUES (%s, %s)
                 ON CONFLICT (projection_name)
-                DO UPDATE SET last_event_id = EXCLUDED.last_event_id
+                DO UPDATE SET last_position = EXCLUDED.last_position
+                WHERE projection_offsets.last_position = %s
                 """,
-                (self.projection_name, event_id),
+                (self._offset_name(shard), position, expected),
             )
-        conn.commit()
+            return cur.rowcount == 1
 
     # --------------------------------------------------
     # Batch processing
     # --------------------------------------------------
-    def run_once(self, limit: int = 100) -> bool:
+    def run_once(self, shard: int = 0, limit: int | None = None) -> bool:
+        limit = limit or self.batch_sizes.get(shard, PROJECTION_BATCH_MIN)
+
         with get_app_db() as conn:
             store = EventStore(conn)
-            projector = Projector(conn)
-            
-            last_event_id = self._get_last_event_id(conn)
-            print(f"Checking for new events after: {last_event_id}")
+            projector = Projector(conn, self.projection.handlers, self.projection_name)
 
-            events = store.load_events_after(
-                last_event_id=last_event_id,
+            last_position = self._get_last_position(conn, shard)
+            page = store.read_tail(
+                after_position=last_position,
                 limit=limit,
+                shard=self._shard_filter(shard),
+                event_types=self.projection.event_types,
             )
 
-            if not events:
-                print("No new events found.")
+            if page.position == last_position:
+                self.batch_sizes[shard] = PROJECTION_BATCH_MIN
+                return False
+
+            # Handlers and offset commit together: one commit per batch, and
+            # a crash never leaves the offset out of step with the tables
+            moved = False
+            with BATCH_SECONDS.labels(self.projection_name).time(), conn.transaction():
+                projector.project_events(page.events)
+                if not self._update_offset(conn, shard, last_position, page.position):
+                    print(
+                        f"❌ {self.projection_name} shard {shard} offset moved by "
+                        "another worker, batch discarded"
+                    )
+                    raise Rollback()
+                moved = True
+            if not moved:
                 return False
 
-            print(f"Found {len(events)} new events to project.")
-            for event in events:
-                print(f"  -> Projecting event {event.event_id} ({event.event_type})")
-                projector.project_event(event)
-                self._update_offset(conn, event.event_id)
+            EVENTS_PROJECTED.labels(self.projection_name).inc(len(page.events))
 
+            print(
+                f"{self.projection_name}: projected {len(page.events)} events "
+                f"up to position {page.position} (shard {shard})"
+            )
+            self._resize_batch(shard, full=page.position - last_position >= limit)
             return True
 
+    def _resize_batch(self, shard: int, full: bool):
+        # A full page means we are behind: grow to amortise round trips.
+        # Otherwise shrink back so live batches stay small.
+        size = self.batch_sizes.get(shard, PROJECTION_BATCH_MIN)
+        if full:
+            self.batch_sizes[shard] = min(size * 2, PROJECTION_BATCH_MAX)
+        else:
+            self.batch_sizes[shard] = max(size // 2, PROJECTION_BATCH_MIN)
+
     # --------------------------------------------------
     # Main loop
     # --------------------------------------------------
     def run(self):
-        print("Projection worker started")
+        print(f"{self.projection_name}: projection worker started ({self.shard_count} shards)")
 
         while True:
+            # Leases die with the connection, so start from scratch
+            self.owned.clear()
             try:
-                processed = self.run_once()
-                if not processed:
-                    time.sleep(0.5)
+                with get_app_db(autocommit=True) as lease_conn, \
+                        get_app_db(autocommit=True) as listen_conn:
+                    self._join(lease_conn)
+
+                    # Every wake-up is a batch of notifications or an idle
+                    # poll tick; either way, rebalance and drain owned shards
+                    # round-robin.
+                    for notifications in EventStore(listen_conn).subscribe():
+                        if not notifications:
+                            self._retire_offsets(lease_conn)
+                        self._rebalance(lease_conn)
+                        busy = sorted(self.owned)
+                        while busy:
+                            busy = [shard for shard in busy if self.run_once(shard)]
             except Exception as e:
-                print("❌ Projection worker error:", e)
+                print(f"❌ {self.projection_name} projection worker error:", e)
                 time.sleep(1)
 
 
@@ -108,9 +293,30 @@ class ProjectionWorker:
 # Entrypoint
 # --------------------------------------------------
 def main():
+    # Optionally only run the projections named on the command line
+    names = sys.argv[1:] or list(PROJECTIONS)
+    unknown = [name for name in names if name not in PROJECTIONS]
+    if unknown:
+        raise SystemExit(f"Unknown projections: {', '.join(unknown)}")
+
     ProjectionWorker._init_tables()
-    worker = ProjectionWorker()
-    worker.run()
+    register_lag_collector()
+    serve_metrics(PROJECTION_METRICS_PORT)
+
+    # Projections progress independently, so a slow one never holds back
+    # the others
+    threads = [
+        threading.Thread(
+            target=ProjectionWorker(PROJECTIONS[name]).run,
+            name=f"projection-{name}",
+            daemon=True,
+        )
+        for name in names
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
 
 
 if __name__ == "__main__":
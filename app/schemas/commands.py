@@ -11,16 +11,21 @@ class CreateThreadRequest(BaseModel):
 class CreateThreadResponse(BaseModel):
     thread_id: str
     event_id: str
+    event_number: int
 
 
 class SendMessageRequest(BaseModel):
     thread_id: str
     content: str = Field(..., min_length=1)
+    expected_version: Optional[int] = Field(
+        None, description="Reject the message unless the thread is at this event number"
+    )
 
 
 class SendMessageResponse(BaseModel):
     thread_id: str
     event_id: str
+    event_number: int
 
 
 class ForkThreadRequest(BaseModel):
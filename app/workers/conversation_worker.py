@@ -1,135 +1,218 @@
 from typing import List, Optional
 from psycopg import Connection
 
+from app.core.codecs import PayloadCodec
 from app.core.event_store import EventStore, Event
-from app.core.langgraph_runner import run_langgraph_from_events
-
-def find_unanswered_user_messages(events: List[Event]) -> List[Event]:
-    responses = {
-        e.payload.get("reply_to")
-        for e in events
-        if e.event_type == "LLMResponseGenerated"
-    }
-
-    return [
-        e for e in events
-        if e.event_type == "UserMessageAdded"
-        and e.event_id.hex not in responses
-    ]
+from app.core.langgraph_runner import GraphRuntime, history_messages, run_langgraph
+from app.core.metrics import REPLIES
+from app.core.reply_stream import ReplyStream
+from app.workers.reply_queue import (
+    ReplyJob,
+    extend_reply_lease,
+    finish_reply_job,
+    retry_reply_job,
+)
+from app.workers.reply_watermarks import (
+    ReplyWatermark,
+    advance_reply_watermark,
+    load_reply_watermark,
+)
+
+def find_unanswered_user_messages(
+    store: EventStore,
+    watermark: ReplyWatermark,
+    up_to: int,
+) -> List[Event]:
+    # One range scan on (thread_id, event_number) past the watermark,
+    # streamed. The list outlives the cursor: replies commit in between.
+    return list(store.iter_thread_events(
+        watermark.thread_id,
+        after=watermark.answered_up_to,
+        up_to=up_to,
+        event_types=["UserMessageAdded"],
+    ))
 
 class ConversationWorker:
-    def __init__(self):
-        pass
-
-    def process_thread(self, conn: Connection, thread_id: str):
-        store = EventStore(conn)
-        events = store.load_thread_events(thread_id)
+    def __init__(self, runtime: Optional[GraphRuntime] = None):
+        # Shared saver and compiled graph; without one, each reply sets up its own
+        self.runtime = runtime
 
-        pending = find_unanswered_user_messages(events)
+    def process_job(self, conn: Connection, job: ReplyJob):
+        try:
+            answered_up_to = self.process_thread(conn, job)
+        except Exception as e:
+            print(f"❌ Error processing thread {job.thread_id}: {e}")
+            conn.rollback()
+            answered_up_to = None
+
+        if answered_up_to is None:
+            retry_reply_job(conn, job)
+        else:
+            finish_reply_job(conn, job, answered_up_to)
+        conn.commit()
+
+    def process_thread(self, conn: Connection, job: ReplyJob) -> Optional[int]:
+        """
+        Answer every pending message of the job's thread, oldest first.
+
+        Returns the event_number up to which the thread is answered, or None
+        if a reply failed or the lease was lost (later messages are left for
+        the retry, so replies stay in order).
+
+        No transaction is open during an LLM call. Each reply then commits
+        in a short transaction of its own, together with the watermark and
+        an extension of the job's lease.
+        """
+        thread_id = job.thread_id
+        # LLM replies are the largest payloads; offload them into event_blobs
+        store = EventStore(conn, codec=PayloadCodec())
+        watermark = load_reply_watermark(conn, thread_id)
+        version = store.current_version(thread_id)
+
+        pending = find_unanswered_user_messages(store, watermark, version)
         if not pending:
-            return
+            return version
         
         print(f"  -> Found {len(pending)} unanswered messages in thread {thread_id}.")
 
-        initial_resume_checkpoint_id = None
-
-        # 1. Try to find the latest checkpoint in the current thread's history
-        for event in reversed(events):
-            if event.event_type == "CheckpointCreated":
-                initial_resume_checkpoint_id = event.payload["checkpoint_id"]
-                print(f"  -> Found latest checkpoint in current thread: {initial_resume_checkpoint_id}")
-                break
+        # 1. Try the latest checkpoint in the current thread's history
+        initial_resume_checkpoint_id = watermark.latest_checkpoint_id
+        if initial_resume_checkpoint_id:
+            print(f"  -> Found latest checkpoint in current thread: {initial_resume_checkpoint_id}")
         
-        # 2. If no local checkpoint, and it's a forked thread, use the parent's checkpoint at the fork point
+        # 2. If no local checkpoint, and it's a forked thread, use the parent's checkpoint at the fork point.
+        # fork-thread appends ThreadCreated and ThreadForked as a branch's first two events.
+        forks = []
         if initial_resume_checkpoint_id is None:
-            fork_event = next((e for e in events if e.event_type == "ThreadForked"), None)
-            if fork_event:
-                parent_thread_id = fork_event.payload["parent_thread_id"]
-                from_event_number = fork_event.payload["from_event_number"]
-                
-                print(f"  -> Fork detected from parent {parent_thread_id} at event {from_event_number}.")
-                parent_events = store.load_thread_events(parent_thread_id)
-                
-                # The CheckpointCreated event is always the one after the LLMResponseGenerated event
-                checkpoint_event = next((e for e in parent_events if e.event_number == from_event_number + 1 and e.event_type == "CheckpointCreated"), None)
-                
-                if checkpoint_event:
-                    initial_resume_checkpoint_id = checkpoint_event.payload["checkpoint_id"]
-                    print(f"  -> Found parent checkpoint to resume from: {initial_resume_checkpoint_id}")
+            forks = store.load_events_up_to(
+                thread_id=thread_id,
+                event_number=2,
+                event_types=["ThreadForked"],
+            )
+
+        if forks:
+            parent_thread_id = forks[0].payload["parent_thread_id"]
+            from_event_number = forks[0].payload["from_event_number"]
+
+            print(f"  -> Fork detected from parent {parent_thread_id} at event {from_event_number}.")
+
+            # The CheckpointCreated event is always the one after the LLMResponseGenerated event
+            parent_checkpoints = store.load_events_up_to(
+                thread_id=parent_thread_id,
+                event_number=from_event_number + 1,
+                event_types=["CheckpointCreated"],
+                after=from_event_number,
+            )
+
+            if parent_checkpoints:
+                initial_resume_checkpoint_id = parent_checkpoints[0].payload["checkpoint_id"]
+                print(f"  -> Found parent checkpoint to resume from: {initial_resume_checkpoint_id}")
 
         
         # Process pending messages, passing the appropriate resume_checkpoint_id
         current_resume_checkpoint_id = initial_resume_checkpoint_id
         for user_event in pending:
-            self._handle_user_message(store, thread_id, user_event, current_resume_checkpoint_id)
+            result = self._generate_reply(store, user_event, current_resume_checkpoint_id)
+            if result is None:
+                return None
+
+            try:
+                # The reply, the watermark and the lease move together
+                with conn.transaction():
+                    self._append_reply(store, user_event, result)
+                    locked_until = extend_reply_lease(conn, job)
+            except Exception as e:
+                REPLIES.labels("error").inc()
+                print(f"    ❌ Error saving the reply to message {user_event.event_id}: {e}")
+                return None
+            print("      - Events saved successfully.")
+            REPLIES.labels("success").inc()
+
+            if locked_until is None:
+                print(f"  -> Lost the lease on thread {thread_id}, leaving the rest to its new owner.")
+                return None
+            job.locked_until = locked_until
             # After processing, the next message should resume from the newly created checkpoint (if any)
-            # This logic will be handled by run_langgraph_from_events internally
+            # This logic will be handled by run_langgraph internally
             # For simplicity here, we assume subsequent calls will fetch the latest
             # This 'current_resume_checkpoint_id' only really applies to the first message in this batch.
             # Subsequent messages in the 'pending' list should just build on the graph state.
             current_resume_checkpoint_id = None # Reset so only the first in batch uses the explicit resume_checkpoint_id
 
-    def _handle_user_message(self, store: EventStore, thread_id: str, user_event: Event, resume_checkpoint_id: Optional[str] = None):
+        return version
+
+    def _generate_reply(self, store: EventStore, user_event: Event, resume_checkpoint_id: Optional[str] = None) -> Optional[dict]:
+        thread_id = user_event.thread_id
         print(f"    -> Processing message {user_event.event_id} in thread {thread_id} to generate AI response...")
         try:
-            # Construct the full history for LangGraph, including parent thread messages if forked
-            full_thread_events = []
-
-            # Load all events for the current thread
-            current_thread_events = store.load_thread_events(thread_id)
-
-            # Check if this is a forked thread
-            fork_event = next((e for e in current_thread_events if e.event_type == "ThreadForked"), None)
-
-            if fork_event:
-                parent_thread_id = fork_event.payload["parent_thread_id"]
-                from_event_number = fork_event.payload["from_event_number"]
-
-                # Load parent thread's messages up to the fork point
-                parent_events = store.load_thread_events(parent_thread_id)
-                full_thread_events.extend([
-                    e for e in parent_events
-                    if e.event_number <= from_event_number
-                ])
-            
-            # Add all events from the current thread (forked or not)
-            full_thread_events.extend(current_thread_events)
-
-            # Filter to include only events up to the current user message, and sort by event_number
-            prior_events = [
-                e for e in full_thread_events
-                if e.event_number <= user_event.event_number
-            ]
-            prior_events.sort(key=lambda e: e.event_number) # Ensure chronological order for LangGraph
-
-            result = run_langgraph_from_events(
-                events=prior_events,
-                thread_id=thread_id,
-                resume_checkpoint_id=resume_checkpoint_id,
-            )
+            # Full history for LangGraph across every ancestor branch, in
+            # lineage order. Only user messages feed the graph; they are
+            # streamed and turned into graph messages as they arrive.
+            messages = history_messages(store.iter_lineage_events(
+                thread_id,
+                up_to=user_event.event_number,
+                event_types=["UserMessageAdded"],
+            ))
+
+            # End the read transaction: no snapshot or lock is held while
+            # waiting on the LLM
+            store.conn.commit()
+
+            # Relay tokens live to /threads/{thread_id}/stream (needs the
+            # runtime's autocommit pool to publish on)
+            stream = None
+            if self.runtime is not None:
+                stream = ReplyStream(self.runtime.pool, thread_id, user_event.event_id.hex)
+
+            try:
+                result = run_langgraph(
+                    messages=messages,
+                    thread_id=thread_id,
+                    resume_checkpoint_id=resume_checkpoint_id,
+                    runtime=self.runtime,
+                    on_token=stream.push if stream else None,
+                )
+            except Exception:
+                if stream:
+                    stream.close(error=True)
+                raise
+            if stream:
+                stream.close(ai_message_id=result["ai_message_id"])
             print(f"      - LangGraph run successful. Result: {result}")
-
             print("      - Saving LLMResponseGenerated and CheckpointCreated events...")
-            store.append_events(
-                thread_id=thread_id,
-                events=[
-                    (
-                        "LLMResponseGenerated",
-                        {
-                            "ai_message_id": result["ai_message_id"],
-                            "content": result["content"],
-                            "reply_to": user_event.event_id.hex,
-                        },
-                    ),
-                    (
-                        "CheckpointCreated",
-                        {
-                            "checkpoint_id": result["checkpoint_id"],
-                            "ai_message_id": result["ai_message_id"],
-                        },
-                    ),
-                ],
-            )
-            print("      - Events saved successfully.")
+            return result
         except Exception as e:
+            REPLIES.labels("error").inc()
             print(f"    ❌ Error processing message {user_event.event_id}: {e}")
+            return None
+
+    def _append_reply(self, store: EventStore, user_event: Event, result: dict):
+        thread_id = user_event.thread_id
+        created = store.append_events(
+            thread_id=thread_id,
+            events=[
+                (
+                    "LLMResponseGenerated",
+                    {
+                        "ai_message_id": result["ai_message_id"],
+                        "content": result["content"],
+                        "reply_to": user_event.event_id.hex,
+                    },
+                ),
+                (
+                    "CheckpointCreated",
+                    {
+                        "checkpoint_id": result["checkpoint_id"],
+                        "ai_message_id": result["ai_message_id"],
+                    },
+                ),
+            ],
+            # One reply per user message, even if two workers race on it
+            idempotency_key=f"reply:{user_event.event_id.hex}",
+        )
+
+        # On a replayed append the stored reply (not ours) is the one that counts
+        checkpoint_id = next(
+            e.payload["checkpoint_id"] for e in created if e.event_type == "CheckpointCreated"
+        )
+        advance_reply_watermark(store.conn, thread_id, user_event.event_number, checkpoint_id)
@@ -0,0 +1,95 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from psycopg import Connection
+
+from app.config.settings import REPLY_LEASE_SECONDS, REPLY_RETRY_DELAY
+
+# Oldest claimable threads first. SKIP LOCKED lets concurrent workers claim
+# different rows without waiting on each other; the lease (locked_until)
+# hides a claimed thread until it is finished or the worker is presumed dead.
+CLAIM_REPLY_JOBS_SQL = """
+    UPDATE reply_queue q
+    SET locked_until = clock_timestamp() + make_interval(secs => %s)
+    FROM (
+        SELECT thread_id
+        FROM reply_queue
+        WHERE locked_until IS NULL
+           OR locked_until < clock_timestamp()
+        ORDER BY enqueued_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    ) claimed
+    WHERE q.thread_id = claimed.thread_id
+    RETURNING q.thread_id, q.last_event_number, q.locked_until
+"""
+
+# Every update below is fenced by the lease as we last set it: once the
+# lease expired and another worker claimed the thread, they match nothing.
+
+# Only dequeue if no newer message was enqueued while we were replying
+FINISH_REPLY_JOB_SQL = """
+    DELETE FROM reply_queue
+    WHERE thread_id = %s
+      AND locked_until = %s
+      AND last_event_number <= %s
+"""
+
+RELEASE_REPLY_JOB_SQL = """
+    UPDATE reply_queue
+    SET locked_until = clock_timestamp() + make_interval(secs => %s)
+    WHERE thread_id = %s
+      AND locked_until = %s
+    RETURNING locked_until
+"""
+
+
+@dataclass
+class ReplyJob:
+    thread_id: str
+    last_event_number: int
+    # Our lease; moved forward by extend_reply_lease
+    locked_until: datetime
+
+
+def claim_reply_jobs(conn: Connection, limit: int = 1) -> List[ReplyJob]:
+    """Lease up to `limit` threads and commit the lease right away."""
+    with conn.cursor() as cur:
+        cur.execute(CLAIM_REPLY_JOBS_SQL, (REPLY_LEASE_SECONDS, limit))
+        jobs = [
+            ReplyJob(row["thread_id"], row["last_event_number"], row["locked_until"])
+            for row in cur.fetchall()
+        ]
+    conn.commit()
+    return jobs
+
+
+def extend_reply_lease(conn: Connection, job: ReplyJob) -> Optional[datetime]:
+    """
+    Push the lease REPLY_LEASE_SECONDS out again, before the next LLM call
+    of a job. Runs in the caller's transaction; once that commits, the
+    caller stores the returned lease on the job. None if the lease was
+    lost to another worker.
+    """
+    with conn.cursor() as cur:
+        cur.execute(RELEASE_REPLY_JOB_SQL, (REPLY_LEASE_SECONDS, job.thread_id, job.locked_until))
+        row = cur.fetchone()
+    return row["locked_until"] if row else None
+
+
+def finish_reply_job(conn: Connection, job: ReplyJob, up_to: int) -> None:
+    """
+    Dequeue a thread answered up to `up_to`, or make it claimable again
+    right away if a newer message arrived meanwhile. Runs in the caller's
+    transaction, so it commits together with the last reply.
+    """
+    with conn.cursor() as cur:
+        cur.execute(FINISH_REPLY_JOB_SQL, (job.thread_id, job.locked_until, up_to))
+        if cur.rowcount == 0:
+            cur.execute(RELEASE_REPLY_JOB_SQL, (0, job.thread_id, job.locked_until))
+
+
+def retry_reply_job(conn: Connection, job: ReplyJob) -> None:
+    with conn.cursor() as cur:
+        cur.execute(RELEASE_REPLY_JOB_SQL, (REPLY_RETRY_DELAY, job.thread_id, job.locked_until))
@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from psycopg import Connection
+
+LOAD_WATERMARK_SQL = """
+    SELECT answered_up_to, latest_checkpoint_id
+    FROM thread_reply_watermarks
+    WHERE thread_id = %s
+"""
+
+# Never moves backwards, e.g. when a replayed (idempotent) reply is seen late
+ADVANCE_WATERMARK_SQL = """
+    INSERT INTO thread_reply_watermarks (thread_id, answered_up_to, latest_checkpoint_id)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (thread_id)
+    DO UPDATE SET
+        answered_up_to = EXCLUDED.answered_up_to,
+        latest_checkpoint_id = EXCLUDED.latest_checkpoint_id,
+        updated_at = NOW()
+    WHERE thread_reply_watermarks.answered_up_to < EXCLUDED.answered_up_to
+"""
+
+
+@dataclass(frozen=True)
+class ReplyWatermark:
+    """
+    Replies are written in message order, so every user message up to
+    `answered_up_to` is answered and the pending ones are exactly the
+    UserMessageAdded events after it.
+    """
+
+    thread_id: str
+    answered_up_to: int = 0
+    latest_checkpoint_id: Optional[str] = None
+
+
+def load_reply_watermark(conn: Connection, thread_id: str) -> ReplyWatermark:
+    with conn.cursor() as cur:
+        cur.execute(LOAD_WATERMARK_SQL, (thread_id,))
+        row = cur.fetchone()
+
+    if not row:
+        return ReplyWatermark(thread_id=thread_id)
+    return ReplyWatermark(
+        thread_id=thread_id,
+        answered_up_to=row["answered_up_to"],
+        latest_checkpoint_id=row["latest_checkpoint_id"],
+    )
+
+
+def advance_reply_watermark(
+    conn: Connection,
+    thread_id: str,
+    answered_up_to: int,
+    checkpoint_id: Optional[str],
+) -> None:
+    with conn.cursor() as cur:
+        cur.execute(ADVANCE_WATERMARK_SQL, (thread_id, answered_up_to, checkpoint_id))
@@ -1,30 +1,103 @@
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config.settings import (
+    CONVERSATION_METRICS_PORT,
+    LLM_CONCURRENCY,
+    SUBSCRIBE_POLL_INTERVAL,
+)
+from app.core.metrics import register_backlog_collector, serve_metrics
 from app.db.postgres import get_app_db
+from app.core.event_store import EventStore
+from app.core.langgraph_runner import GraphRuntime
 from app.workers.conversation_worker import ConversationWorker
+from app.workers.reply_queue import ReplyJob, claim_reply_jobs
 
 
-def run():
-    worker = ConversationWorker()
-    print("Conversation worker started")
+class ReplyDispatcher:
+    """
+    Claims reply jobs while a slot is free and runs each on a thread pool,
+    so up to `concurrency` threads wait on the LLM at once.
 
-    while True:
-        print("Scanning for threads with new messages...")
-        
+    A job covers a whole thread and is leased to one runner, so replies
+    within a thread stay in order. Each job gets its own connection.
+    """
+
+    def __init__(self, worker: ConversationWorker, concurrency: int = LLM_CONCURRENCY):
+        self.worker = worker
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="reply")
+        # Set when there may be something new to claim
+        self.wakeup = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                with get_app_db() as conn:
+                    while True:
+                        self.slots.acquire()
+                        self.wakeup.clear()
+                        try:
+                            jobs = claim_reply_jobs(conn)
+                        except Exception:
+                            self.slots.release()
+                            raise
+
+                        if not jobs:
+                            self.slots.release()
+                            self._check_runtime()
+                            self.wakeup.wait(SUBSCRIBE_POLL_INTERVAL)
+                            continue
+
+                        self.executor.submit(self._run_job, jobs[0])
+            except Exception as e:
+                print(f"❌ Error in reply dispatcher: {e}")
+                time.sleep(1)
+
+    def _check_runtime(self):
+        # Health-check the graph runtime's pool while idle
+        if self.worker.runtime is None:
+            return
+        try:
+            self.worker.runtime.check()
+        except Exception as e:
+            print(f"❌ Graph runtime health check failed: {e}")
+
+    def _run_job(self, job: ReplyJob):
         try:
             with get_app_db() as conn:
-                # In v1, we scan all threads (safe but naive)
-                with conn.cursor() as cur:
-                    cur.execute("SELECT DISTINCT thread_id FROM events")
-                    threads = [r["thread_id"] for r in cur.fetchall()]
-                
-                print(f"Found {len(threads)} active threads.")
-                for thread_id in threads:
-                    worker.process_thread(conn, thread_id)
+                self.worker.process_job(conn, job)
         except Exception as e:
-            print(f"❌ Error in conversation worker run loop: {e}")
+            print(f"❌ Error processing thread {job.thread_id}: {e}")
+        finally:
+            self.slots.release()
+            # The thread may have been released with newer messages
+            self.wakeup.set()
 
 
-        time.sleep(1)
+def run():
+    runtime = GraphRuntime()
+    runtime.open()
+    dispatcher = ReplyDispatcher(ConversationWorker(runtime))
+    register_backlog_collector()
+    serve_metrics(CONVERSATION_METRICS_PORT)
+    threading.Thread(target=dispatcher.run, name="reply-dispatcher", daemon=True).start()
+    print(f"Conversation worker started ({LLM_CONCURRENCY} concurrent replies)")
+
+    while True:
+        try:
+            with get_app_db(autocommit=True) as listen_conn:
+                for notifications in EventStore(listen_conn).subscribe():
+                    # Idle ticks (empty batches) also wake the dispatcher,
+                    # which picks up retries and jobs whose lease expired
+                    if not notifications or any(
+                        n["event_type"] == "UserMessageAdded" for n in notifications
+                    ):
+                        dispatcher.wakeup.set()
+        except Exception as e:
+            print(f"❌ Error in conversation worker run loop: {e}")
+            time.sleep(1)
 
 if __name__ == "__main__":
     run()
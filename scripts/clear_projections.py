@@ -12,7 +12,9 @@ TRUNCATE TABLE
     thread_heads,
     thread_timeline,
     message_checkpoints,
-    branches_projection
+    branches_projection,
+    thread_lineage,
+    message_search
 RESTART IDENTITY;
 """
 
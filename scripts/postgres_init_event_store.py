@@ -17,7 +17,7 @@ DB_CONFIG = {
 INIT_SQL = """
 CREATE EXTENSION IF NOT EXISTS "pgcrypto";
 
-CREATE TABLE events (
+CREATE TABLE IF NOT EXISTS events (
     event_id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     event_type TEXT NOT NULL,
     thread_id TEXT NOT NULL,
@@ -26,18 +26,178 @@ CREATE TABLE events (
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 
-CREATE UNIQUE INDEX uniq_thread_event_number
+CREATE UNIQUE INDEX IF NOT EXISTS uniq_thread_event_number
 ON events (thread_id, event_number);
 
-CREATE INDEX idx_events_thread_order
+CREATE INDEX IF NOT EXISTS idx_events_thread_order
 ON events (thread_id, event_number);
 
-CREATE INDEX idx_events_type
+CREATE INDEX IF NOT EXISTS idx_events_type
 ON events (event_type);
 
-CREATE INDEX idx_events_created_at
+CREATE INDEX IF NOT EXISTS idx_events_created_at
 ON events (created_at);
 
+-- Global, monotonically increasing position across all threads.
+-- Projections page by this column instead of (created_at, event_id).
+ALTER TABLE events
+ADD COLUMN IF NOT EXISTS global_position BIGINT GENERATED ALWAYS AS IDENTITY;
+
+-- The tail reader ages a hole by the insert time of the row after it.
+-- NOW() is the start of the transaction, which may have been open for a
+-- whole LLM call before appending, so created_at is stamped at insert.
+ALTER TABLE events
+ALTER COLUMN created_at SET DEFAULT clock_timestamp();
+
+-- created_at is included so the tail reader's gap check is index-only
+CREATE UNIQUE INDEX IF NOT EXISTS uniq_events_global_position
+ON events (global_position) INCLUDE (created_at);
+
+-- Client-supplied idempotency key, stored on the first event of the
+-- append it belongs to. A retried command returns that append instead
+-- of writing it again.
+ALTER TABLE events
+ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uniq_events_idempotency_key
+ON events (idempotency_key)
+WHERE idempotency_key IS NOT NULL;
+
+-- Large payload values, compressed and content-addressed by the sha256
+-- of the original text so identical content is stored once
+CREATE TABLE IF NOT EXISTS event_blobs (
+    digest TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,
+    data BYTEA NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE events
+ADD COLUMN IF NOT EXISTS blob_digest TEXT REFERENCES event_blobs (digest);
+
+-- Current version (last event_number) of every thread. Appends bump
+-- this row instead of aggregating MAX(event_number) under a lock.
+CREATE TABLE IF NOT EXISTS streams (
+    thread_id TEXT PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+
+INSERT INTO streams (thread_id, version)
+SELECT thread_id, MAX(event_number)
+FROM events
+GROUP BY thread_id
+ON CONFLICT (thread_id) DO NOTHING;
+
+-- Push every committed event to LISTENers on the "events" channel
+-- (EventStore.subscribe). Notifications are only delivered on commit.
+CREATE OR REPLACE FUNCTION notify_event_appended()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'events',
+        json_build_object(
+            'thread_id', NEW.thread_id,
+            'event_type', NEW.event_type,
+            'event_number', NEW.event_number,
+            'global_position', NEW.global_position
+        )::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER notify_event_appended
+AFTER INSERT ON events
+FOR EACH ROW EXECUTE FUNCTION notify_event_appended();
+
+-- Threads with user messages waiting for a reply, claimed by conversation
+-- workers with FOR UPDATE SKIP LOCKED (app/workers/reply_queue.py).
+-- last_event_number is the newest enqueued UserMessageAdded.
+CREATE TABLE IF NOT EXISTS reply_queue (
+    thread_id TEXT PRIMARY KEY,
+    last_event_number BIGINT NOT NULL,
+    enqueued_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_until TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_reply_queue_enqueued_at
+ON reply_queue (enqueued_at);
+
+CREATE OR REPLACE FUNCTION enqueue_reply()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO reply_queue (thread_id, last_event_number)
+    VALUES (NEW.thread_id, NEW.event_number)
+    ON CONFLICT (thread_id) DO UPDATE
+    SET last_event_number = GREATEST(
+        reply_queue.last_event_number,
+        EXCLUDED.last_event_number
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER enqueue_reply
+AFTER INSERT ON events
+FOR EACH ROW
+WHEN (NEW.event_type = 'UserMessageAdded')
+EXECUTE FUNCTION enqueue_reply();
+
+-- Per thread: every user message up to answered_up_to has its reply, and
+-- the checkpoint of the latest reply. Advanced by the conversation worker
+-- in the same transaction as the reply append (app/workers/reply_watermarks.py).
+CREATE TABLE IF NOT EXISTS thread_reply_watermarks (
+    thread_id TEXT PRIMARY KEY,
+    answered_up_to BIGINT NOT NULL,
+    latest_checkpoint_id TEXT,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Backfill for threads that predate the watermark: everything before the
+-- first unanswered user message counts as answered
+INSERT INTO thread_reply_watermarks (thread_id, answered_up_to, latest_checkpoint_id)
+SELECT
+    s.thread_id,
+    COALESCE(
+        (
+            SELECT MIN(u.event_number) - 1
+            FROM events u
+            WHERE u.thread_id = s.thread_id
+              AND u.event_type = 'UserMessageAdded'
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM events r
+                  WHERE r.thread_id = u.thread_id
+                    AND r.event_type = 'LLMResponseGenerated'
+                    AND r.payload->>'reply_to' = replace(u.event_id::text, '-', '')
+              )
+        ),
+        s.version
+    ),
+    (
+        SELECT c.payload->>'checkpoint_id'
+        FROM events c
+        WHERE c.thread_id = s.thread_id
+          AND c.event_type = 'CheckpointCreated'
+        ORDER BY c.event_number DESC
+        LIMIT 1
+    )
+FROM streams s
+WHERE NOT EXISTS (
+    SELECT 1 FROM thread_reply_watermarks w WHERE w.thread_id = s.thread_id
+);
+
+-- Backfill the reply queue (after the watermarks, which it reads): only
+-- threads whose newest user message is past their watermark
+INSERT INTO reply_queue (thread_id, last_event_number)
+SELECT u.thread_id, MAX(u.event_number)
+FROM events u
+JOIN thread_reply_watermarks w ON w.thread_id = u.thread_id
+WHERE u.event_type = 'UserMessageAdded'
+GROUP BY u.thread_id, w.answered_up_to
+HAVING MAX(u.event_number) > w.answered_up_to
+ON CONFLICT (thread_id) DO NOTHING;
+
 CREATE OR REPLACE FUNCTION forbid_event_update()
 RETURNS trigger AS $$
 BEGIN
@@ -45,7 +205,7 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
-CREATE TRIGGER no_event_update
+CREATE OR REPLACE TRIGGER no_event_update
 BEFORE UPDATE ON events
 FOR EACH ROW EXECUTE FUNCTION forbid_event_update();
 
@@ -56,7 +216,7 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
-CREATE TRIGGER no_event_delete
+CREATE OR REPLACE TRIGGER no_event_delete
 BEFORE DELETE ON events
 FOR EACH ROW EXECUTE FUNCTION forbid_event_delete();
 """
@@ -0,0 +1,18 @@
+import sys
+
+from app.projections.rebuild import rebuild_projections
+from app.projections.registry import PROJECTIONS
+
+
+if __name__ == "__main__":
+    # Rebuild the projections named on the command line, or all of them
+    names = sys.argv[1:]
+    unknown = [name for name in names if name not in PROJECTIONS]
+    if unknown:
+        raise SystemExit(f"Unknown projections: {', '.join(unknown)}")
+
+    try:
+        rebuild_projections(names)
+    except Exception as e:
+        print(f"❌ Error rebuilding projections: {e}")
+        sys.exit(1)